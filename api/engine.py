@@ -1,7 +1,15 @@
+import hashlib
+import json
+import logging
+from collections.abc import AsyncIterator
+
 from pydantic import BaseModel
 
 import text2graph.llm as llm
+from text2graph.alignment_service import get_alignment_stats
+from text2graph.cache import get_completion_cache
 from text2graph.pipeline import ExtractionPipeline, get_handlers
+from text2graph.prompt import PromptLayout
 from text2graph.schema import GraphOutput
 
 # Data models
@@ -11,6 +19,7 @@ class TextToGraphRequest(BaseModel):
     text: str
     model: str
     extraction_pipeline: ExtractionPipeline
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT
 
 
 class SearchToGraphRequest(BaseModel):
@@ -19,44 +28,139 @@ class SearchToGraphRequest(BaseModel):
     ttl: bool
     hydrate: bool
     extraction_pipeline: ExtractionPipeline
+    max_concurrency: int | None = None
+    pack_token_budget: int | None = None
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT
 
 
-async def text_to_graph(text: str, model: str, extraction_pipeline: ExtractionPipeline):
+async def text_to_graph(
+    text: str,
+    model: str,
+    extraction_pipeline: ExtractionPipeline,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+):
     """Business logic layer for llm graph extraction."""
 
     prompt_handler, alignment_handler = get_handlers(extraction_pipeline)
-    return await llm.ask_llm(
-        text=text,
-        prompt_handler=prompt_handler,
-        alignment_handler=alignment_handler,
-        model=model,
-        temperature=0.0,
-        to_triplets=True,
+    key = llm.extraction_key(
+        hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        model,
+        prompt_handler,
+        alignment_handler,
+        hydrate=True,
+        prompt_layout=prompt_layout,
     )
+    graph = await llm.EXTRACTION_FLIGHTS.do(
+        key,
+        lambda: llm.ask_llm(
+            text=text,
+            prompt_handler=prompt_handler,
+            alignment_handler=alignment_handler,
+            model=model,
+            temperature=0.0,
+            to_triplets=True,
+            prompt_layout=prompt_layout,
+        ),
+    )
+    return graph.model_copy(deep=True)
 
 
-async def search_to_graph_slow(**kwargs) -> list[str] | list[GraphOutput]:
-    """Business logic layer for llm graph extraction from search."""
-    # Add more API customization logic here if needed.
-
+def _search_to_graph_slow_kwargs(kwargs: dict) -> dict:
     extraction_pipeline = kwargs.pop("extraction_pipeline")
     prompt_handler, alignment_handler = get_handlers(extraction_pipeline)
-    return await llm.llm_graph_from_search(
-        model="mixtral",
-        prompt_handler=prompt_handler,
-        alignment_handler=alignment_handler,
+    return {
+        "model": "mixtral",
+        "prompt_handler": prompt_handler,
+        "alignment_handler": alignment_handler,
         **kwargs,
-    )
-
+    }
 
-async def search_to_graph_fast(**kwargs) -> list[str] | list[GraphOutput]:
-    """Business logic layer for llm graph extraction from search using cached graph."""
-    # Add more API customization logic here if needed.
 
+def _search_to_graph_fast_kwargs(kwargs: dict) -> dict:
     extraction_pipeline = kwargs.pop("extraction_pipeline")
+    # Cached graphs do not call the LLM
+    kwargs.pop("max_concurrency", None)
+    kwargs.pop("pack_token_budget", None)
+    kwargs.pop("prompt_layout", None)
     if extraction_pipeline != ExtractionPipeline.LOCATION_STRATNAME:
         raise NotImplementedError(
             f"Fast search to graph only supports {ExtractionPipeline.LOCATION_STRATNAME}"
         )
+    return kwargs
+
+
+async def search_to_graph_slow(**kwargs) -> list[str] | list[GraphOutput]:
+    """Business logic layer for llm graph extraction from search."""
+    # Add more API customization logic here if needed.
+
+    return await llm.llm_graph_from_search(**_search_to_graph_slow_kwargs(kwargs))
+
+
+async def search_to_graph_fast(**kwargs) -> list[str] | list[GraphOutput]:
+    """Business logic layer for llm graph extraction from search using cached graph."""
+    # Add more API customization logic here if needed.
+
+    return await llm.fast_llm_graph_from_search(**_search_to_graph_fast_kwargs(kwargs))
+
+
+def iter_search_to_graph_slow(**kwargs) -> AsyncIterator[tuple[int, str | GraphOutput]]:
+    """Streaming variant of `search_to_graph_slow`, yielding each paragraph as soon as it is ready."""
+    return llm.iter_llm_graph_from_search(**_search_to_graph_slow_kwargs(kwargs))
+
+
+def iter_search_to_graph_fast(**kwargs) -> AsyncIterator[tuple[int, str | GraphOutput]]:
+    """Streaming variant of `search_to_graph_fast`, yielding each paragraph as soon as it is ready."""
+    return llm.iter_fast_llm_graph_from_search(**_search_to_graph_fast_kwargs(kwargs))
+
+
+async def encode_stream(
+    outputs: AsyncIterator[tuple[int, str | GraphOutput]], sse: bool = False
+) -> AsyncIterator[str]:
+    """Encode streamed graphs as newline-delimited JSON, or server-sent events if `sse`.
+
+    Each record is `{"index": ..., "ttl": ...}` or `{"index": ..., "graph": ...}`, where index is the retrieval rank.
+    Since the response status is already sent, a failure is reported as a final `{"error": ...}` record.
+    """
+
+    def encode(record: dict) -> str:
+        data = json.dumps(record, ensure_ascii=False)
+        return f"data: {data}\n\n" if sse else f"{data}\n"
+
+    try:
+        async for i, output in outputs:
+            if isinstance(output, GraphOutput):
+                yield encode({"index": i, "graph": output.model_dump(mode="json")})
+            else:
+                yield encode({"index": i, "ttl": output})
+    except Exception as error:
+        logging.error(f"Failed to stream response: {error}")
+        yield encode({"error": str(error)})
+
+
+def llm_cache_stats() -> dict:
+    """Hit/miss counters of the LLM completion cache."""
+
+    completion_cache = get_completion_cache()
+    if completion_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **completion_cache.stats}
+
+
+def singleflight_stats() -> dict:
+    """Counters of coalesced concurrent extraction requests."""
+    return llm.EXTRACTION_FLIGHTS.stats
+
+
+def alignment_stats() -> dict:
+    """Counters of how each alignment handler resolved names."""
 
-    return await llm.fast_llm_graph_from_search(**kwargs)
+    stats = {}
+    batching = get_alignment_stats()
+    for extraction_pipeline in ExtractionPipeline:
+        _, alignment_handler = get_handlers(extraction_pipeline)
+        entity_type = alignment_handler.entity_type.value
+        stats[entity_type] = {
+            **alignment_handler.stats,
+            "batching": batching.get(entity_type, {}),
+        }
+    return stats
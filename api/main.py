@@ -1,16 +1,37 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 import engine
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import APIKeyHeader
 
 from text2graph import __version__ as base_version
+from text2graph.alignment_service import close_alignment_services
+from text2graph.geolocation.geocode import close_geocode_client, get_geocode_client
+from text2graph.macrostrat import close_macrostrat_client, get_macrostrat_client
+from text2graph.providers import get_provider_registry
 
 logging.basicConfig(level=logging.INFO)
 
 
-app = FastAPI(title="Text2Graph API", version=base_version)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-lived LLM provider clients shared by all requests
+    provider_registry = get_provider_registry()
+    await provider_registry.startup()
+    # Long-lived Macrostrat and geocode clients shared by all hydrations
+    get_macrostrat_client()
+    get_geocode_client()
+    yield
+    await provider_registry.aclose()
+    await close_macrostrat_client()
+    await close_geocode_client()
+    close_alignment_services()
+
+
+app = FastAPI(title="Text2Graph API", version=base_version, lifespan=lifespan)
 
 # Api-Key Authentication
 API_KEY = os.getenv("API_KEY")
@@ -80,3 +101,92 @@ async def search_to_graph_fast(request: engine.SearchToGraphRequest):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error
         )
+
+
+def streaming_response(http_request: Request, outputs) -> StreamingResponse:
+    """NDJSON streaming response, or server-sent events if the client accepts `text/event-stream`."""
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    return StreamingResponse(
+        engine.encode_stream(outputs, sse=sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+    )
+
+
+@app.post(
+    "/search_to_graph_slow/stream",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["LLM"],
+)
+async def search_to_graph_slow_stream(
+    request: engine.SearchToGraphRequest, http_request: Request
+):
+    """Stream the LLM graph of each paragraph for the search query as soon as it is extracted."""
+    logging.info(f"Received request: {request}")
+    try:
+        outputs = engine.iter_search_to_graph_slow(**request.model_dump())
+    except Exception as error:
+        logging.error(f"Failed to process request: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error
+        )
+    return streaming_response(http_request, outputs)
+
+
+@app.post(
+    "/search_to_graph_fast/stream",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["LLM"],
+)
+async def search_to_graph_fast_stream(
+    request: engine.SearchToGraphRequest, http_request: Request
+):
+    """Stream the cached LLM graph of each paragraph for the search query as soon as it is hydrated."""
+    logging.info(f"Received request: {request}")
+    try:
+        outputs = engine.iter_search_to_graph_fast(**request.model_dump())
+    except Exception as error:
+        logging.error(f"Failed to process request: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error
+        )
+    return streaming_response(http_request, outputs)
+
+
+@app.get(
+    "/llm_cache_stats",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["debug"],
+)
+async def llm_cache_stats():
+    """Report the LLM completion cache usage."""
+    return engine.llm_cache_stats()
+
+
+@app.get(
+    "/provider_stats",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["debug"],
+)
+async def provider_stats():
+    """Report connection reuse of the LLM provider clients."""
+    return get_provider_registry().stats
+
+
+@app.get(
+    "/singleflight_stats",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["debug"],
+)
+async def singleflight_stats():
+    """Report how many concurrent extraction requests were coalesced."""
+    return engine.singleflight_stats()
+
+
+@app.get(
+    "/alignment_stats",
+    dependencies=[Depends(has_valid_api_key)],
+    tags=["debug"],
+)
+async def alignment_stats():
+    """Report how many names were aligned by exact, canonical or embedding lookup."""
+    return engine.alignment_stats()
@@ -1,5 +1,6 @@
 import argparse
 import asyncio
+import json
 import logging
 import pickle
 import re
@@ -11,9 +12,17 @@ from tqdm import tqdm
 
 from text2graph.alignment import get_alignment_handler
 from text2graph.askxdd import get_weaviate_client
-from text2graph.llm import post_process
-from text2graph.prompt import get_prompt_handler
+from text2graph.cache import get_completion_cache
+from text2graph.llm import (
+    align_graphs,
+    pack_paragraphs,
+    post_process,
+    split_packed_output,
+)
+from text2graph.macrostrat import close_macrostrat_client
+from text2graph.prompt import PromptLayout, get_prompt_handler
 from text2graph.schema import Provenance
+from text2graph.utils import JSONStreamValidator, is_json
 
 
 def get_paragraph_ids(job_index: int, batch_size: int, ids_pickle: str) -> list[str]:
@@ -35,11 +44,17 @@ class BatchInferenceRunner:
         self,
         id_pickle: str,
         batch_size: int = 2000,
+        pack_token_budget: int | None = None,
+        prompt_layout: PromptLayout = PromptLayout.DEFAULT,
     ):
         self.id_pickle = id_pickle
         # Do not change across runs, it will mess up indexing
         self.batch_size = batch_size
+        self.pack_token_budget = pack_token_budget
+        self.prompt_layout = prompt_layout
         self.infrastructure_loaded = False
+        # One event loop for the whole run, so that pooled clients (e.g., Macrostrat) are reused across paragraphs
+        self.loop = asyncio.new_event_loop()
 
     def load_infrastructure(
         self, prompt_handler_name: str, alignment_handler_name: str
@@ -58,11 +73,13 @@ class BatchInferenceRunner:
             tensor_parallel_size=1,
             enforce_eager=True,
             disable_custom_all_reduce=True,
+            enable_prefix_caching=self.prompt_layout == PromptLayout.PREFIX_CACHE,
         )
         self.sampling_params = vllm.SamplingParams(
             temperature=0, max_tokens=2048, stop=["[/INST]", "[INST]"]
         )
         self.mixtral_prompt_template = "<s> [INST] {system} {user} [/INST] Model answer</s> [INST] Reply the output json only, do not provide any explanation or notes. [/INST]"
+        self.completion_cache = get_completion_cache()
         self.infrastructure_loaded = True
 
     def run(self, job_index: int, mini_batch_size: int = 200) -> None:
@@ -115,10 +132,9 @@ class BatchInferenceRunner:
     def process_mini_batch(self, ids: list[str]) -> dict:
         """Process a mini-batch to produce raw output with meta-data."""
 
-        # Get prompts and metadata
-        hashed_texts, paper_ids, prompts = [], [], []
-
-        for id in tqdm(ids, desc="Created prompts"):
+        # Get texts and metadata
+        found_ids, hashed_texts, paper_ids, texts = [], [], [], []
+        for id in tqdm(ids, desc="Fetched paragraphs"):
             paragraph = self.weaviate_client.data_object.get_by_id(
                 id, class_name="Paragraph"
             )
@@ -126,25 +142,120 @@ class BatchInferenceRunner:
                 logging.error(f"Paragraph {id} not found.")
                 continue
 
-            text = paragraph["properties"]["text_content"]
-            messages = self.prompt_handler.get_gpt_messages(text)
-            prompt = self.mixtral_prompt_template.format(
-                system=messages[0]["content"], user=messages[1]["content"]
-            )
-            prompts.append(prompt)
+            found_ids.append(id)
+            texts.append(paragraph["properties"]["text_content"])
             hashed_texts.append(paragraph["properties"]["hashed_text"])
             paper_ids.append(paragraph["properties"]["paper_id"])
 
-        # Generate LLM outputs
-        llm_outputs = self.llm.generate(prompts, self.sampling_params)
-        raw_outputs = [output.outputs[0].text.strip() for output in llm_outputs]
+        # One LLM request per paragraph, or per pack of paragraphs
+        if self.pack_token_budget:
+            packs = pack_paragraphs(texts, self.pack_token_budget)
+        else:
+            packs = [[i] for i in range(len(texts))]
+
+        requests = []
+        for pack in tqdm(packs, desc="Created prompts"):
+            if self.pack_token_budget:
+                messages = self.prompt_handler.get_packed_gpt_messages(
+                    {found_ids[i]: texts[i] for i in pack}, layout=self.prompt_layout
+                )
+            else:
+                messages = self.prompt_handler.get_gpt_messages(
+                    texts[pack[0]], layout=self.prompt_layout
+                )
+            requests.append(messages)
+
+        raw_pack_outputs = self.generate(requests)
+
+        # Split packed outputs back to one raw output per paragraph. Only raw vllm text is cleaned up, split
+        # outputs are already valid json.
+        raw_outputs: list[str] = [""] * len(texts)
+        unsplit: list[int] = []
+        for pack, raw_output in zip(packs, raw_pack_outputs):
+            if not self.pack_token_budget:
+                raw_outputs[pack[0]] = self.clean_raw_output(raw_output)
+                continue
+
+            try:
+                split = split_packed_output(
+                    self.clean_raw_output(raw_output), [found_ids[i] for i in pack]
+                )
+            except (json.JSONDecodeError, ValueError) as e:
+                logging.error(f"Error splitting packed output: {e}, {raw_output}")
+                unsplit.extend(pack)
+                continue
+            for i in pack:
+                raw_outputs[i] = split[found_ids[i]]
+
+        # Re-run the paragraphs of unsplittable packs one by one
+        if unsplit:
+            logging.info(f"Re-running {len(unsplit)} paragraphs unpacked.")
+            retry_requests = [
+                self.prompt_handler.get_gpt_messages(
+                    texts[i], layout=self.prompt_layout
+                )
+                for i in unsplit
+            ]
+            for i, raw_output in zip(unsplit, self.generate(retry_requests)):
+                raw_outputs[i] = self.clean_raw_output(raw_output)
+
         return {
-            "ids": ids,
+            "ids": found_ids,
             "paper_ids": paper_ids,
             "hashed_texts": hashed_texts,
             "raw_outputs": raw_outputs,
         }
 
+    def generate(self, requests: list[list[dict]]) -> list[str]:
+        """Generate raw outputs for GPT style messages, serving cached completions first."""
+
+        model_name = self.llm.llm_engine.model_config.__dict__["model"]
+        cache_keys = []
+        raw_outputs: list[str | None] = [None] * len(requests)
+        if self.completion_cache is not None:
+            cache_keys = [
+                self.completion_cache.make_key(
+                    model_name,
+                    self.prompt_handler.version,
+                    self.sampling_params.temperature,
+                    messages,
+                )
+                for messages in requests
+            ]
+            raw_outputs = [self.completion_cache.get(key) for key in cache_keys]
+        miss_idx = [i for i, raw_output in enumerate(raw_outputs) if raw_output is None]
+
+        # Generate LLM outputs for the misses only
+        if miss_idx:
+            prompts = [
+                self.mixtral_prompt_template.format(
+                    system=requests[i][0]["content"], user=requests[i][1]["content"]
+                )
+                for i in miss_idx
+            ]
+            llm_outputs = self.llm.generate(prompts, self.sampling_params)
+            for i, output in zip(miss_idx, llm_outputs):
+                raw_outputs[i] = output.outputs[0].text.strip()
+                if self.completion_cache is not None and is_json(
+                    self.clean_raw_output(raw_outputs[i])  # type: ignore
+                ):
+                    self.completion_cache.put(cache_keys[i], raw_outputs[i])
+
+        if self.completion_cache is not None:
+            logging.info(f"Completion cache: {self.completion_cache.stats}")
+        return raw_outputs  # type: ignore
+
+    @staticmethod
+    def clean_raw_output(raw_output: str) -> str:
+        """vllm-specific clean up before json conversion."""
+        raw_output = raw_output.replace("\n", "").replace("\\", "")
+
+        # Cut everything the model generated after the top-level json object
+        validator = JSONStreamValidator()
+        if validator.feed(raw_output):
+            return validator.text
+        return re.sub(r"\}[^}]*$", "}", raw_output)
+
     def post_process_with_prov(
         self,
         ids: list[str],
@@ -154,7 +265,7 @@ class BatchInferenceRunner:
     ) -> list[dict]:
         """Post processing with provenance."""
 
-        outputs = []
+        rows = []
         for id, paper_id, hashed_text, raw_output in tqdm(
             zip(ids, paper_ids, hashed_texts, raw_outputs),
             desc="Post-processing",
@@ -170,46 +281,51 @@ class BatchInferenceRunner:
                 },
             )
             t1 = time.perf_counter()
-            # vllm-specific clean up and json conversion
-            raw_output = raw_output.replace("\n", "").replace("\\", "")
-            raw_output = re.sub(r"\}[^}]*$", "}", raw_output)
-
-            t2 = time.perf_counter()
 
             try:
-                triplets = asyncio.run(
+                graph = self.loop.run_until_complete(
                     post_process(
                         raw_llm_output=raw_output,
                         prompt_handler=self.prompt_handler,
-                        alignment_handler=self.alignment_handler,
                         hydrate=False,
                         provenance=vllm_prov,
                     )
                 )
-
-                # Convert to plain json
-                triplets = triplets.model_dump_json(exclude_unset=True)
-
-                output = {
-                    "id": id,
-                    "hashed_text": hashed_text,
-                    "paper_id": paper_id,
-                    "triplets": triplets,
-                }
-                outputs.append(output)
+                rows.append((id, paper_id, hashed_text, graph))
 
             except Exception as e:
                 logging.error(
                     f"Error post-processing paragraph {id}: {e}, {raw_output}"
                 )
                 pass
-            t3 = time.perf_counter()
+            t2 = time.perf_counter()
 
             logging.debug(
-                f"Time taken: {t3 - t0:.2f}s (prov: {t1-t0:.2f}s, regex cleanup: {t2-t1:.2f}s, alignment: {t3-t2:.2f}s)"
+                f"Time taken: {t2 - t0:.2f}s (prov: {t1-t0:.2f}s, conversion: {t2-t1:.2f}s)"
             )
 
-        return outputs
+        # Align the whole mini-batch in one encoder pass
+        t0 = time.perf_counter()
+        align_graphs([row[-1] for row in rows], self.alignment_handler)
+        logging.debug(
+            f"Alignment of {len(rows)} graphs: {time.perf_counter() - t0:.2f}s"
+        )
+
+        return [
+            {
+                "id": id,
+                "hashed_text": hashed_text,
+                "paper_id": paper_id,
+                # Convert to plain json
+                "triplets": graph.model_dump_json(exclude_unset=True),
+            }
+            for id, paper_id, hashed_text, graph in rows
+        ]
+
+    def close(self) -> None:
+        """Close the shared Macrostrat client and the event loop."""
+        self.loop.run_until_complete(close_macrostrat_client())
+        self.loop.close()
 
 
 def main(
@@ -219,13 +335,23 @@ def main(
     job_index_end: int,
     mini_batch_size: int,
     debug: bool,
+    pack_token_budget: int | None,
+    prompt_layout: str,
 ):
     logging_level = logging.DEBUG if debug else logging.INFO
     logging.basicConfig(level=logging_level)
-    runner = BatchInferenceRunner(id_pickle=id_pickle, batch_size=batch_size)
+    runner = BatchInferenceRunner(
+        id_pickle=id_pickle,
+        batch_size=batch_size,
+        pack_token_budget=pack_token_budget,
+        prompt_layout=PromptLayout(prompt_layout),
+    )
 
-    for job_index in range(job_index_start, job_index_end):
-        runner.run(job_index=job_index, mini_batch_size=mini_batch_size)
+    try:
+        for job_index in range(job_index_start, job_index_end):
+            runner.run(job_index=job_index, mini_batch_size=mini_batch_size)
+    finally:
+        runner.close()
 
 
 if __name__ == "__main__":
@@ -235,6 +361,13 @@ if __name__ == "__main__":
     parser.add_argument("--job_index_end", type=int, required=True)
     parser.add_argument("--batch_size", type=int, default=2000)
     parser.add_argument("--mini_batch_size", type=int, default=100)
+    parser.add_argument("--pack_token_budget", type=int, default=None)
+    parser.add_argument(
+        "--prompt_layout",
+        type=str,
+        default=PromptLayout.DEFAULT.value,
+        choices=[layout.value for layout in PromptLayout],
+    )
     parser.add_argument("--debug", action="store_true")
 
     outputs = main(**vars(parser.parse_args()))
@@ -6,7 +6,7 @@ from streamlit_extras.stylable_container import stylable_container
 
 from text2graph import __version__ as base_version
 from text2graph.gkm.convert import to_ttl
-from text2graph.llm import fast_llm_graph_from_search
+from text2graph.llm import iter_fast_llm_graph_from_search
 from text2graph.schema import GraphOutput
 
 logging.basicConfig(level=logging.INFO)
@@ -52,15 +52,13 @@ if st.button("Run"):
             "Hydrating entities with top-k > 3 can be very slow. Please reduce top-k."
         )
         st.stop()
-    with st.spinner("Running models..."):
-        assert hydrate is not None
-        assert ttl is not None
-        outputs = fast_llm_graph_from_search(
+
+    async def render():
+        """Render each graph as soon as it is hydrated."""
+        outputs = iter_fast_llm_graph_from_search(
             query=query, top_k=top_k, hydrate=hydrate, ttl=False, with_text=True
         )
-        outputs = asyncio.run(outputs)
-
-        for i, output in enumerate(outputs):
+        async for i, output in outputs:
             assert isinstance(output, GraphOutput)
             # Source Text
             st.text_area("Text", output.text_content, height=300, key=i)
@@ -74,3 +72,8 @@ if st.button("Run"):
             with st.expander("GraphOutput"):
                 with stylable_container("codeblock", custom_code_block_css):
                     st.code(output)
+
+    with st.spinner("Running models..."):
+        assert hydrate is not None
+        assert ttl is not None
+        asyncio.run(render())
@@ -0,0 +1,58 @@
+"""Benchmark per-name vs batched entity alignment.
+
+Usage:
+python scripts/benchmark_alignment.py --entity_type strat_name --n 100
+
+`get_closest_known_entity` runs one encoder forward pass and one full similarity scan per name.
+`get_closest_known_entities` encodes all names at once and scores them with a single matrix product.
+The alignment memo is disabled and names resolved by the exact or canonical-form index are skipped, so that
+both sides measure encoder lookups.
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from text2graph.alignment import get_alignment_handler
+
+
+def main(entity_type: str, test_set: str, n: int, repeat: int) -> None:
+    handler = get_alignment_handler(entity_type)
+    handler.memo.max_size = 0
+    handler.memo.entries.clear()
+
+    names = pd.read_parquet(test_set)["formation_name"].tolist()
+    names = [name for name in names if handler.match_known_entity(name) is None][:n]
+
+    # Warm up the encoder
+    handler.get_closest_known_entities(names[:8])
+
+    per_name, batched = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        single = [handler.get_closest_known_entity(name) for name in names]
+        t1 = time.perf_counter()
+        batch = handler.get_closest_known_entities(names)
+        t2 = time.perf_counter()
+        per_name.append(t1 - t0)
+        batched.append(t2 - t1)
+
+    assert single == batch, "Batched alignment disagrees with per-name alignment"
+
+    best_per_name, best_batched = min(per_name), min(batched)
+    print(f"{len(names)} names against {len(handler.known_entity_names)} entities")
+    print(f"  per-name: {best_per_name * 1e3:.1f} ms")
+    print(f"   batched: {best_batched * 1e3:.1f} ms")
+    print(f"   speedup: {best_per_name / best_batched:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entity_type", type=str, default="strat_name")
+    parser.add_argument(
+        "--test_set", type=str, default="data/testset_micro.parquet.gzip"
+    )
+    parser.add_argument("--n", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(**vars(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""Benchmark alignment encoder backends against the PyTorch SentenceTransformer.
+
+Usage:
+python scripts/benchmark_encoders.py --export  # Export the ONNX models first
+python scripts/benchmark_encoders.py --n 200
+
+Each backend runs in a fresh process, so that its peak RSS is measured on its own. Agreement is the cosine
+similarity between each backend's normalized embeddings and the "torch" ones.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from text2graph.encoders import EncoderBackend, export_onnx_encoder, get_encoder
+
+
+def run_backend(backend: str, model_name: str, names: list[str], queue) -> None:
+    encoder = get_encoder(backend, model_name)
+    encoder.encode(names[:8])  # Warm up
+
+    latencies = []
+    for name in names:
+        t0 = time.perf_counter()
+        encoder.encode([name], normalize_embeddings=True)
+        latencies.append(time.perf_counter() - t0)
+
+    queue.put(
+        {
+            "embeddings": encoder.encode(names, normalize_embeddings=True),
+            "ms_per_name": statistics.median(latencies) * 1e3,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def main(model_name: str, test_set: str, n: int, export: bool) -> None:
+    if export:
+        print(f"Exported to {export_onnx_encoder(model_name)}")
+
+    names = pd.read_parquet(test_set)["formation_name"].dropna().tolist()[:n]
+    context = multiprocessing.get_context("spawn")
+
+    results = {}
+    for backend in EncoderBackend:
+        queue = context.Queue()
+        process = context.Process(
+            target=run_backend, args=(backend.value, model_name, names, queue)
+        )
+        process.start()
+        results[backend] = queue.get()
+        process.join()
+
+    reference = results[EncoderBackend.TORCH]["embeddings"]
+    for backend, result in results.items():
+        cosine = (result["embeddings"] * reference).sum(axis=1)
+        print(
+            f"{backend.value:>10}: "
+            f"{result['ms_per_name']:.2f} ms/name, "
+            f"peak RSS {result['max_rss_mb']:.0f} MB, "
+            f"cosine vs torch min {np.min(cosine):.4f} / mean {np.mean(cosine):.4f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", type=str, default="all-MiniLM-L6-v2")
+    parser.add_argument(
+        "--test_set", type=str, default="data/testset_micro.parquet.gzip"
+    )
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--export", action="store_true")
+    main(**vars(parser.parse_args()))
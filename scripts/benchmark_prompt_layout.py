@@ -0,0 +1,80 @@
+"""Benchmark prompt processing time of the default vs prefix-cache prompt layouts on Ollama.
+
+Usage:
+OLLAMA_URL=http://localhost:11434/api/chat python scripts/benchmark_prompt_layout.py --model mixtral
+
+Ollama reports `prompt_eval_count` and `prompt_eval_duration` (ns) per request. With a shared static
+prefix, the KV cache of the previous request is reused and fewer prompt tokens need to be evaluated.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+
+import httpx
+import pandas as pd
+
+from text2graph.prompt import PromptLayout, get_prompt_handler
+
+
+async def run_layout(
+    client: httpx.AsyncClient,
+    url: str,
+    model: str,
+    texts: list[str],
+    prompt_version: str,
+    layout: PromptLayout,
+) -> list[dict]:
+    prompt_handler = get_prompt_handler(prompt_version)
+    results = []
+    for text in texts:
+        response = await client.post(
+            url,
+            json={
+                "model": model,
+                "messages": prompt_handler.get_gpt_messages(text, layout=layout),
+                "stream": False,
+                "format": "json",
+                "options": {"temperature": 0.0, "num_predict": 1},
+            },
+        )
+        response.raise_for_status()
+        data = response.json()
+        results.append(
+            {
+                "prompt_eval_count": data.get("prompt_eval_count", 0),
+                "prompt_eval_ms": data.get("prompt_eval_duration", 0) / 1e6,
+            }
+        )
+    return results
+
+
+async def main(model: str, prompt_version: str, test_set: str, n: int) -> None:
+    url = os.environ["OLLAMA_URL"]
+    texts = pd.read_parquet(test_set)["paragraph"].tolist()[:n]
+
+    async with httpx.AsyncClient(timeout=600) as client:
+        for layout in PromptLayout:
+            results = await run_layout(
+                client, url, model, texts, prompt_version, layout
+            )
+            # Skip the first request, it warms the cache for both layouts
+            eval_ms = [r["prompt_eval_ms"] for r in results[1:]]
+            eval_count = [r["prompt_eval_count"] for r in results[1:]]
+            print(
+                f"{layout.value:>14}: "
+                f"prompt eval {statistics.mean(eval_ms):.1f} ms/request, "
+                f"{statistics.mean(eval_count):.0f} evaluated tokens/request"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="mixtral")
+    parser.add_argument("--prompt_version", type=str, default="stratname_v3")
+    parser.add_argument(
+        "--test_set", type=str, default="data/testset_micro.parquet.gzip"
+    )
+    parser.add_argument("--n", type=int, default=30)
+    asyncio.run(main(**vars(parser.parse_args())))
@@ -16,6 +16,9 @@ else
     tag=$1
 fi
 
+# Ship fresh Macrostrat dictionary snapshots in the images, so that they start without network access
+python scripts/refresh_macrostrat_snapshot.py
+
 # demo_container=ghcr.io/$GH_USERNAME/"$GH_CONTAINER_NAME"_demo
 # echo "Building $demo_container:$tag"
 # docker build -t $demo_container:latest -t $demo_container:$tag  -f ./demo/Dockerfile .
@@ -0,0 +1,41 @@
+"""Refresh the local snapshots of the Macrostrat `/defs` tables with conditional requests, then rebuild the
+SQLite mirror used by `get_records` when any of them changed.
+
+Usage:
+python scripts/refresh_macrostrat_snapshot.py
+python scripts/refresh_macrostrat_snapshot.py --tables strat_names minerals
+
+Snapshots are written to MACROSTRAT_SNAPSHOT_DIR (default: text2graph/binaries/macrostrat). Tables that have not
+changed since the last refresh are not downloaded again.
+"""
+
+import argparse
+import logging
+
+from text2graph.macrostrat import (
+    SNAPSHOT_TABLES,
+    build_mirror,
+    mirror_path,
+    refresh_snapshot,
+    snapshot_dir,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main(tables: list[str]) -> None:
+    any_changed = False
+    for table in tables:
+        changed = refresh_snapshot(table)
+        any_changed = any_changed or changed
+        print(f"{table}: {'updated' if changed else 'up to date'}")
+    print(f"Snapshots in {snapshot_dir()}")
+
+    if any_changed or not mirror_path().is_file():
+        print(f"Mirror rebuilt at {build_mirror()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", nargs="+", default=SNAPSHOT_TABLES)
+    main(**vars(parser.parse_args()))
@@ -1,4 +1,9 @@
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
 
 import pytest
 from dotenv import load_dotenv
@@ -8,6 +13,11 @@ from text2graph.prompt import get_prompt_handler
 
 load_dotenv()
 
+# Small Macrostrat snapshots with the entities used in tests, so that no test downloads the full tables
+os.environ["MACROSTRAT_SNAPSHOT_DIR"] = str(
+    Path(__file__).parent / "fixtures" / "macrostrat"
+)
+
 
 @pytest.fixture
 def api_auth_header() -> dict:
@@ -42,3 +52,122 @@ def stratname_alignment_handler():
 @pytest.fixture
 def mineral_alignment_handler():
     return AlignmentHandler.load(EntityType.MINERAL)
+
+
+@pytest.fixture
+def fake_ollama():
+    """Factory of minimal local Ollama servers (`/api/chat` and `/api/tags`), returning the chat url.
+
+    `latency` delays every chat response, `status` is returned by every route, and a streaming chat request
+    yields `stream_chunks` as separate NDJSON lines. `server.n_streamed` counts the chunks actually sent.
+    """
+    servers = []
+
+    def start(
+        latency: float = 0.0,
+        status: int = 200,
+        content: str = '{"triplets": []}',
+        stream_chunks: list[str] | None = None,
+    ) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body: dict) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._reply({"models": []})
+
+            def do_POST(self):
+                data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(latency)
+                if not data.get("stream"):
+                    self._reply({"message": {"content": content}})
+                    return
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                chunks = stream_chunks or [content]
+                try:
+                    for i, chunk in enumerate(chunks):
+                        line = {
+                            "message": {"content": chunk},
+                            "done": i == len(chunks) - 1,
+                        }
+                        self.wfile.write((json.dumps(line) + "\n").encode())
+                        self.wfile.flush()
+                        server.n_streamed += 1
+                        time.sleep(0.01)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client cancelled the generation
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.n_streamed = 0  # type: ignore
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/api/chat"
+
+    start.servers = servers  # type: ignore
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def fake_macrostrat():
+    """Minimal local Macrostrat `/defs/<table>` server, to be used through `server.base_url`.
+
+    Responses carry an ETag and requests with a matching If-None-Match get a 304. `server.tables` holds the rows
+    served per table, `server.requests` counts requests per table and the next `server.failures` requests get a 503.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            table = self.path.split("?")[0].rsplit("/", 1)[-1]
+            server.requests[table] = server.requests.get(table, 0) + 1
+            if server.failures > 0:
+                server.failures -= 1
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if table not in server.tables:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            payload = json.dumps(
+                {"success": {"v": 2, "data": server.tables[table]}}
+            ).encode()
+            etag = f'"{hash(payload)}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.tables = {}  # type: ignore
+    server.requests = {}  # type: ignore
+    server.failures = 0  # type: ignore
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/api"  # type: ignore
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
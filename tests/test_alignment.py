@@ -1,3 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from text2graph.alignment import AlignmentHandler, AlignmentMemo, canonical_name
+from text2graph.embedding_store import load_embedding_store
+from text2graph.macrostrat import EntityType
+from text2graph.ann import IVFIndex, normalize
+
+
 def test_stratname_alignment(stratname_alignment_handler):
     expected_n = 45646
     assert stratname_alignment_handler.known_entity_embeddings.shape[0] == expected_n
@@ -20,3 +31,200 @@ def test_get_closest_known_mineral(mineral_alignment_handler):
     mineral = "Gold"
     closest_mineral = mineral_alignment_handler.get_closest_known_entity(mineral)
     assert closest_mineral == "gold"
+
+
+def test_get_closest_known_entities_matches_single(stratname_alignment_handler):
+    names = ["Abbey head bed.", "Shakopee", "Not a formation at all", "Abbey head bed."]
+    expected = [
+        stratname_alignment_handler.get_closest_known_entity(name) for name in names
+    ]
+    assert stratname_alignment_handler.get_closest_known_entities(names) == expected
+    assert stratname_alignment_handler.get_closest_known_entities([]) == []
+
+
+def test_ann_index_matches_brute_force(stratname_alignment_handler):
+    handler = stratname_alignment_handler
+    names = ["Abbey head bed.", "Shakopee", "St Peter sandstone", "Not a formation"]
+
+    handler.ann_index = None
+    expected = handler.get_closest_known_entities(names)
+    handler.ann_index = IVFIndex.build(handler.normalized_embeddings)
+    assert handler.get_closest_known_entities(names) == expected
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("Shakopee Formation", "shakopee fm"),
+        ("shakopee  Fm.", "shakopee fm"),
+        ("St. Peter Sandstone", "st peter sandstone"),
+        ("Jasper Member", "jasper mbr"),
+    ],
+)
+def test_canonical_name(name, expected):
+    assert canonical_name(name) == expected
+
+
+def test_alignment_fast_path(stratname_alignment_handler):
+    handler = stratname_alignment_handler
+    names = ["Shakopee", "shakopee.", "Abbey head bed."]
+
+    assert handler.get_closest_known_entities(names) == [
+        "Shakopee",
+        "Shakopee",
+        "Abbey Head Bed",
+    ]
+    assert handler.stats["exact_hits"] == 1
+    assert handler.stats["canonical_hits"] == 2
+    assert handler.stats["encoder_lookups"] == 0
+
+
+def test_alignment_memo_lru_and_persistence(tmp_path):
+    memo = AlignmentMemo(max_size=2)
+    memo.put("Everton", 0.95, "Everton", 1.0)
+    memo.put("St Peter", 0.95, None, 0.5)
+    assert memo.get("Everton", 0.95) == ("Everton", 1.0)
+    memo.put(
+        "Jasper", 0.95, "Jasper", 0.97
+    )  # Evicts "St Peter", the least recently used
+
+    assert memo.get("St Peter", 0.95) is None
+    assert memo.get("Everton", 0.9) is None
+
+    path = tmp_path / "memo.json"
+    memo.save(path, version="v1")
+    warm = AlignmentMemo()
+    warm.load(path, version="v1")
+    assert warm.get("Jasper", 0.95) == ("Jasper", 0.97)
+
+    cold = AlignmentMemo()
+    cold.load(path, version="v2")
+    assert len(cold) == 0
+
+
+class StubEncoder:
+    def __init__(self, embedding: np.ndarray) -> None:
+        self.embedding = embedding
+
+    def encode(self, names, normalize_embeddings=True):
+        return np.array([self.embedding] * len(names))
+
+
+@pytest.mark.parametrize(
+    "lexical_margin, expected",
+    [(0.1, "Shakopee Formation"), (0.05, None), (0.0, None)],
+)
+def test_alignment_lexical_rescue_memoizes_rescued_score(lexical_margin, expected):
+    # The best embedding match (St Peter, 0.96) is below the threshold, Shakopee is spelled alike at 0.90
+    handler = AlignmentHandler(
+        EntityType.STRAT_NAME,
+        ["Shakopee Formation", "St Peter Sandstone"],
+        np.array([[1.0, 0.0, 0.0], [0.8, 0.6, 0.0]], dtype=np.float32),
+        lexical_threshold=0.4,
+        lexical_margin=lexical_margin,
+    )
+    handler._encoder = StubEncoder(normalize(np.array([[0.9, 0.4, 0.17]]))[0])
+
+    name = "Shakopee Formatoin"
+    assert handler.get_closest_known_entities([name], threshold=0.97) == [
+        expected or name
+    ]
+    closest, score = handler.memo.get(name, 0.97)
+    assert closest == expected
+    assert score == pytest.approx(0.90 if expected else 0.96, abs=0.01)
+
+
+def test_alignment_memo_concurrent_saves(tmp_path):
+    path = tmp_path / "memo.json"
+    memos = []
+    for i in range(8):
+        memo = AlignmentMemo()
+        memo.put(f"Formation {i}", 0.95, None, 0.5)
+        memos.append(memo)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda memo: memo.save(path, version="v1"), memos))
+
+    # The last writer wins whole, no temporary file is left behind
+    assert [p.name for p in tmp_path.iterdir()] == ["memo.json"]
+    warm = AlignmentMemo()
+    warm.load(path, version="v1")
+    assert len(warm) == 1
+
+
+def test_alignment_handler_concurrent_saves(tmp_path):
+    handler = AlignmentHandler(
+        EntityType.STRAT_NAME,
+        ["Shakopee Formation", "St Peter Sandstone"],
+        np.eye(2, dtype=np.float32),
+    )
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: handler.save(tmp_path), range(8)))
+
+    # One writer publishes the version, the others discard their own copy
+    versions = tmp_path / "versions"
+    assert [p.name for p in versions.iterdir()] == [handler.known_entity_set_version]
+
+
+@pytest.mark.parametrize(
+    "content",
+    ['{"version": "v1", "entries": [["Everton", 0.9', '{"entries": []}', "[1, 2]"],
+)
+def test_alignment_memo_ignores_corrupt_file(tmp_path, content):
+    path = tmp_path / "memo.json"
+    path.write_text(content)
+    memo = AlignmentMemo()
+    memo.load(path, version="v1")
+    assert len(memo) == 0
+
+
+def test_alignment_memo_skips_encoder(stratname_alignment_handler):
+    handler = stratname_alignment_handler
+    names = ["Abbey head bed and more", "Not a formation at all"]
+
+    first = handler.get_closest_known_entities(names)
+    assert handler.get_closest_known_entities(names) == first
+    assert handler.stats["encoder_lookups"] == 2
+    assert handler.stats["memo_hits"] == 2
+
+
+def test_handlers_load_encoder_lazily_and_share_it(
+    stratname_alignment_handler, mineral_alignment_handler
+):
+    assert stratname_alignment_handler._encoder is None
+    stratname_alignment_handler.get_closest_known_entities(["Abbey head bed and more"])
+    assert stratname_alignment_handler.encoder is mineral_alignment_handler.encoder
+
+
+def test_refresh_encodes_only_added_names(stratname_alignment_handler, tmp_path):
+    handler = stratname_alignment_handler
+    names = list(handler.known_entity_names[:100])
+    refreshed = handler.refresh(names[10:] + ["Made Up Formation"])
+
+    assert handler.stats["encoder_lookups"] == 0
+    assert list(refreshed.known_entity_names) == names[10:] + ["Made Up Formation"]
+    np.testing.assert_allclose(
+        refreshed.normalized_embeddings[:90],
+        np.asarray(handler.normalized_embeddings[10:100], dtype=np.float32),
+    )
+
+    # Each save is published as a new version, older ones are pruned
+    handler.refresh(names).save(tmp_path)
+    refreshed.save(tmp_path)
+    refreshed.refresh(names[:50]).save(tmp_path)
+
+    current = (tmp_path / "CURRENT").read_text().strip()
+    assert len(list((tmp_path / "versions").iterdir())) == 2
+    loaded_names, _ = load_embedding_store(tmp_path / "versions" / current)
+    assert list(loaded_names) == names[:50]
+
+
+def test_get_candidates(stratname_alignment_handler):
+    candidates = stratname_alignment_handler.get_candidates(
+        ["Shakopee Formation", "St Petr Sandstone"], k=3
+    )
+
+    assert len(candidates) == 2
+    assert all(len(c) == 3 for c in candidates)
+    assert candidates[1][0].name == "St Peter Sandstone"
+    assert all(a.score >= b.score for c in candidates for a, b in zip(c, c[1:]))
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+from text2graph.alignment_service import AlignmentService
+
+
+class RecordingHandler:
+    """Aligns names to upper case and records each batch and the thread it ran on."""
+
+    def __init__(self) -> None:
+        self.batches: list[tuple[list[str], float]] = []
+        self.threads: set[int] = set()
+
+    def get_closest_known_entities(
+        self, names: list[str], threshold: float = 0.95
+    ) -> list[str]:
+        self.batches.append((names, threshold))
+        self.threads.add(threading.get_ident())
+        return [name.upper() for name in names]
+
+
+def test_concurrent_requests_share_a_batch():
+    handler = RecordingHandler()
+    service = AlignmentService(handler, max_wait=0.05)  # type: ignore
+
+    async def main():
+        return await asyncio.gather(
+            service.get_closest_known_entities(["a", "b"]),
+            service.get_closest_known_entities(["c"]),
+            service.get_closest_known_entities([]),
+            service.get_closest_known_entities(["d"], threshold=0.9),
+        )
+
+    results = asyncio.run(main())
+    assert results == [["A", "B"], ["C"], [], ["D"]]
+    assert sorted(handler.batches) == [(["a", "b", "c"], 0.95), (["d"], 0.9)]
+    assert threading.get_ident() not in handler.threads
+    assert service.stats["names"] == 4
+    service.close()
+
+
+def test_full_batch_flushes_without_waiting():
+    handler = RecordingHandler()
+    service = AlignmentService(handler, max_batch_size=2, max_wait=60)  # type: ignore
+
+    async def main():
+        return await asyncio.wait_for(
+            service.get_closest_known_entities(["a", "b"]), timeout=5
+        )
+
+    assert asyncio.run(main()) == ["A", "B"]
+    service.close()
+
+
+def test_failed_batch_raises_in_each_caller():
+    class FailingHandler:
+        def get_closest_known_entities(self, names, threshold=0.95):
+            raise RuntimeError("encoder failed")
+
+    service = AlignmentService(FailingHandler())  # type: ignore
+
+    async def main():
+        return await asyncio.gather(
+            service.get_closest_known_entities(["a"]),
+            service.get_closest_known_entities(["b"]),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+    service.close()
+
+
+def test_pending_batch_of_a_closed_loop_is_dropped():
+    handler = RecordingHandler()
+    service = AlignmentService(handler, max_wait=60)  # type: ignore
+
+    async def cancelled():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                service.get_closest_known_entities(["a"]), timeout=0.01
+            )
+
+    # The first loop shuts down before its flush is due
+    asyncio.run(cancelled())
+
+    async def main():
+        return await asyncio.wait_for(
+            service.get_closest_known_entities(["b"]), timeout=5
+        )
+
+    service.max_wait = 0.01
+    assert asyncio.run(main()) == ["B"]
+    assert handler.batches == [(["b"], 0.95)]
+    service.close()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from text2graph.ann import (
+    ANNIndex,
+    IVFIndex,
+    load_ann_index,
+    normalize,
+    save_ann_index,
+)
+
+
+def clustered_embeddings(n: int = 3000, dim: int = 32, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(40, dim))
+    embeddings = centers[rng.integers(0, 40, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    embeddings = normalize(embeddings)
+
+    # Half the queries are near-duplicates of known rows, half are unrelated
+    near = embeddings[rng.integers(0, n, size=100)] + 0.05 * rng.normal(size=(100, dim))
+    far = rng.normal(size=(100, dim))
+    return embeddings, normalize(np.concatenate([near, far]))
+
+
+def brute_force(embeddings, queries, threshold):
+    similarity = queries @ embeddings.T
+    idx = np.argmax(similarity, axis=1)
+    scores = similarity[np.arange(len(queries)), idx]
+    return np.where(scores >= threshold, idx, -1)
+
+
+def test_ivf_matches_brute_force_at_threshold():
+    embeddings, queries = clustered_embeddings()
+    index = IVFIndex.build(embeddings)
+
+    for threshold in [0.8, 0.95]:
+        indices, scores = index.search(queries, k=1, min_similarity=threshold)
+        ann = np.where(scores[:, 0] >= threshold, indices[:, 0], -1)
+        expected = brute_force(embeddings, queries, threshold)
+        assert (expected >= 0).any()
+        np.testing.assert_array_equal(ann, expected)
+
+
+def test_ivf_batched_search_matches_per_query_search():
+    embeddings, queries = clustered_embeddings()
+    index = IVFIndex.build(embeddings)
+
+    for min_similarity in [None, 0.8]:
+        indices, scores = index.search(queries, k=3, min_similarity=min_similarity)
+        expected_indices, expected_scores = ANNIndex.search(
+            index, queries, k=3, min_similarity=min_similarity
+        )
+        np.testing.assert_array_equal(indices, expected_indices)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_ivf_save_and_load(tmp_path):
+    embeddings, queries = clustered_embeddings(n=500)
+    index = IVFIndex.build(embeddings)
+    save_ann_index(index, tmp_path)
+
+    loaded = load_ann_index(tmp_path, embeddings)
+    assert isinstance(loaded, IVFIndex)
+    np.testing.assert_array_equal(
+        loaded.search(queries, k=3)[0], index.search(queries, k=3)[0]
+    )
+
+    # An index built for another set of embeddings is ignored
+    assert load_ann_index(tmp_path, embeddings[:-1]) is None
@@ -1,3 +1,5 @@
+import json
+
 import requests
 
 # We can use `TestClient`, but the relative import fails when the test is in the root/tests directory. I prefer not to place the test inside the api/ folder.
@@ -90,3 +92,52 @@ def test_api_search_to_graph_fast(api_auth_header, pipeline="Location to Stratig
     )
     assert response.status_code == 200
     assert "@prefix" in response.json()[0]
+
+
+def test_api_search_to_graph_fast_stream(
+    api_auth_header, pipeline="Location to Stratigraphy"
+):
+    with requests.post(
+        f"{LOCAL_API_URL}/search_to_graph_fast/stream",
+        headers=api_auth_header,
+        json={
+            "query": "Smithville formation",
+            "top_k": 2,
+            "ttl": True,
+            "hydrate": False,
+            "extraction_pipeline": pipeline,
+        },
+        stream=True,
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert records
+    assert all("@prefix" in record["ttl"] for record in records)
+
+
+def test_api_search_to_graph_slow_stream_sse(
+    api_auth_header, pipeline="Location to Stratigraphy"
+):
+    with requests.post(
+        f"{LOCAL_API_URL}/search_to_graph_slow/stream",
+        headers={**api_auth_header, "Accept": "text/event-stream"},
+        json={
+            "query": "Smithville formation",
+            "top_k": 2,
+            "ttl": False,
+            "hydrate": False,
+            "extraction_pipeline": pipeline,
+        },
+        stream=True,
+    ) as response:
+        assert response.status_code == 200
+        events = [
+            json.loads(line.removeprefix(b"data: "))
+            for line in response.iter_lines()
+            if line
+        ]
+
+    assert sorted(event["index"] for event in events) == [0, 1]
+    assert all("triplets" in event["graph"] for event in events)
@@ -0,0 +1,34 @@
+from text2graph.cache import CompletionCache
+
+MESSAGES = [{"role": "user", "content": "Shakopee formation is in Minnesota."}]
+
+
+def test_completion_cache_hit_and_miss(tmp_path):
+    cache = CompletionCache(tmp_path / "llm_cache.sqlite")
+    key = cache.make_key("gpt-4o", "v3", 0.0, MESSAGES)
+
+    assert cache.get(key) is None
+    cache.put(key, '{"triplets": []}')
+    assert cache.get(key) == '{"triplets": []}'
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_completion_cache_key_depends_on_request():
+    key = CompletionCache.make_key("gpt-4o", "v3", 0.0, MESSAGES)
+    assert key == CompletionCache.make_key("gpt-4o", "v3", 0.0, MESSAGES)
+    assert key != CompletionCache.make_key("gpt-4o", "v0", 0.0, MESSAGES)
+    assert key != CompletionCache.make_key("gpt-4o", "v3", 0.5, MESSAGES)
+    assert key != CompletionCache.make_key("mixtral", "v3", 0.0, MESSAGES)
+
+
+def test_completion_cache_evicts_least_recently_used(tmp_path):
+    cache = CompletionCache(tmp_path / "llm_cache.sqlite", max_bytes=20)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", "x" * 10)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
@@ -0,0 +1,73 @@
+import numpy as np
+
+from text2graph.ann import normalize
+from text2graph.embedding_store import (
+    NameTable,
+    closest_rows,
+    load_embedding_store,
+    save_embedding_store,
+    top_k_rows,
+)
+
+
+def test_embedding_store_roundtrip(tmp_path):
+    names = ["Shakopee Formation", "", "Gröden Formation", "St. Peter Sandstone"]
+    embeddings = np.random.default_rng(0).normal(size=(4, 8))
+    save_embedding_store(tmp_path, names, embeddings)
+
+    loaded_names, loaded_embeddings = load_embedding_store(tmp_path)
+
+    assert isinstance(loaded_names, NameTable)
+    assert list(loaded_names) == names
+    assert loaded_names[-1] == names[-1]
+    assert loaded_names[1:3] == names[1:3]
+    assert isinstance(loaded_embeddings, np.memmap)
+    assert loaded_embeddings.dtype == np.float16
+    np.testing.assert_allclose(
+        np.linalg.norm(loaded_embeddings.astype(np.float32), axis=1), 1.0, atol=1e-3
+    )
+
+
+def test_closest_rows_is_chunk_independent():
+    rng = np.random.default_rng(0)
+    embeddings = normalize(rng.normal(size=(1000, 16)))
+    queries = normalize(rng.normal(size=(20, 16)))
+
+    idx, scores = closest_rows(queries, embeddings, chunk_size=1000)
+    chunked_idx, chunked_scores = closest_rows(queries, embeddings, chunk_size=7)
+
+    np.testing.assert_array_equal(idx, chunked_idx)
+    np.testing.assert_allclose(scores, chunked_scores, rtol=1e-6)
+
+
+def test_float16_store_matches_float32(tmp_path):
+    """Alignment decisions on the float16 store agree with float32 brute force."""
+
+    rng = np.random.default_rng(0)
+    dim, n, threshold = 384, 5000, 0.95
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    targets = rng.integers(0, n, size=500)
+    queries = normalize(embeddings[targets] + 0.2 * rng.normal(size=(500, dim)))
+    save_embedding_store(tmp_path, [str(i) for i in range(n)], embeddings)
+    _, stored = load_embedding_store(tmp_path)
+
+    idx32, scores32 = closest_rows(queries, normalize(embeddings))
+    idx16, scores16 = closest_rows(queries, stored)
+
+    np.testing.assert_allclose(scores16, scores32, atol=2e-3)
+    np.testing.assert_array_equal(idx16, idx32)
+    # Only scores within float16 error of the threshold may flip the decision
+    flipped = (scores16 >= threshold) != (scores32 >= threshold)
+    assert np.all(np.abs(scores32[flipped] - threshold) < 2e-3)
+
+
+def test_top_k_rows_matches_full_sort():
+    rng = np.random.default_rng(0)
+    embeddings = normalize(rng.normal(size=(500, 16)))
+    queries = normalize(rng.normal(size=(10, 16)))
+
+    idx, scores = top_k_rows(queries, embeddings, k=5, chunk_size=64)
+
+    expected = np.argsort(-(queries @ embeddings.T), axis=1)[:, :5]
+    np.testing.assert_array_equal(idx, expected)
+    assert np.all(np.diff(scores, axis=1) <= 0)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from text2graph import encoders
+from text2graph.encoders import ONNXEncoder, export_onnx_encoder, get_encoder
+
+NAMES = ["Shakopee Formation", "St. Peter Sandstone", "gold", "Jasper Member"]
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_encoder_matches_torch(backend, tmp_path):
+    pytest.importorskip("onnxruntime")
+    path = export_onnx_encoder("all-MiniLM-L6-v2", tmp_path)
+    encoder = ONNXEncoder(path, quantized=backend == "onnx-int8")
+    reference = get_encoder("torch", "all-MiniLM-L6-v2")
+
+    x = encoder.encode(NAMES, normalize_embeddings=True)
+    y = reference.encode(NAMES, normalize_embeddings=True)
+
+    assert x.shape == y.shape
+    assert np.all((x * y).sum(axis=1) > 0.98)
+
+
+def test_encoder_registry_shares_models(monkeypatch):
+    # Stub encoders, the registry itself needs no model download
+    created = []
+
+    def create_encoder(backend, model_name, device):
+        created.append((backend, model_name, device))
+        return object()
+
+    monkeypatch.setattr(encoders, "_encoders", {})
+    monkeypatch.setattr(encoders, "create_encoder", create_encoder)
+
+    encoder = get_encoder("torch", "all-MiniLM-L6-v2")
+    assert get_encoder("torch", "all-MiniLM-L6-v2", device="cpu") is encoder
+    assert get_encoder("onnx", "all-MiniLM-L6-v2", device="cuda") is not encoder
+    assert len(created) == 2
@@ -3,7 +3,11 @@ from datetime import timedelta
 import pytest
 
 
-from text2graph.geolocation.geocode import RateLimitedClient, get_gps
+from text2graph.geolocation.geocode import (
+    RateLimitedClient,
+    get_geocode_client,
+    get_gps,
+)
 
 
 GEOCODE_RESPONSE = [{"lat": "43.074761", "lon": "-89.3837613"}]
@@ -34,3 +38,15 @@ def test_get_gps(httpx_mock) -> None:
     assert lat == 43.074761
     assert lon == -89.3837613
     assert url == "https://geocode.maps.co/search?&q=Madison, WI"
+
+
+def test_geocode_client_shared_per_loop() -> None:
+    async def get_twice():
+        return get_geocode_client(), get_geocode_client()
+
+    first, second = asyncio.run(get_twice())
+    assert first is second
+    assert first.is_closed  # Closed when its loop shut down
+
+    third, _ = asyncio.run(get_twice())
+    assert third is not first
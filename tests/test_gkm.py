@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from rdflib import Graph
 from rdflib.compare import to_isomorphic, IsomorphicGraph
@@ -115,3 +119,22 @@ def test_triplet_to_rdf(filename, triplet, request):
     expected = isomorphicgraph_from_ttl_file(filename)
     test = to_isomorphic(triplet_to_rdf(request.getfixturevalue(triplet)))
     assert test == expected
+
+
+IMPORT_TIME_BUDGET = 5.0  # seconds
+
+
+def test_import_convert_without_macrostrat(tmp_path):
+    """Importing the converter (and so `text2graph.llm`) must not reach Macrostrat or exceed the budget."""
+
+    env = {
+        **os.environ,
+        "MACROSTRAT_OFFLINE": "1",
+        "MACROSTRAT_SNAPSHOT_DIR": str(tmp_path),  # No snapshot: any lookup would raise
+    }
+    code = "import time; t = time.perf_counter(); import text2graph.gkm.convert; print(time.perf_counter() - t)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout) < IMPORT_TIME_BUDGET
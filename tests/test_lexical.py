@@ -0,0 +1,22 @@
+from text2graph.lexical import TrigramIndex, trigrams
+
+NAMES = ["Shakopee", "Shakopee Dolomite", "St. Peter Sandstone", "Everton", "Peters"]
+
+
+def test_trigrams_use_canonical_form():
+    assert trigrams("Shakopee Formation") == trigrams("shakopee  fm.")
+
+
+def test_trigram_index_finds_misspelled_names():
+    index = TrigramIndex(NAMES)
+
+    assert index.search("St Petr Sandstone", k=1)[0][0] == 2
+    assert index.search("Shak0pee", k=1)[0][0] == 0
+    assert index.search("Everton", k=1) == [(3, 1.0)]
+    assert index.search("xyz") == []
+
+
+def test_trigram_index_ranks_by_similarity():
+    results = TrigramIndex(NAMES).search("Shakopee Dolomite", k=3)
+    assert [i for i, _ in results[:2]] == [1, 0]
+    assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
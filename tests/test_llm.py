@@ -1,8 +1,20 @@
+import json
+
 import pytest
 import asyncio
 
-from text2graph.llm import ask_llm, llm_graph_from_search, post_process
+from text2graph.cache import get_completion_cache
+from text2graph.llm import (
+    OpenSourceModel,
+    ask_llm,
+    cached_query_llm,
+    llm_graph_from_search,
+    pack_paragraphs,
+    post_process,
+    split_packed_output,
+)
 from text2graph.schema import GraphOutput, Mineral, Stratigraphy
+from text2graph.utils import SingleFlight
 
 SMITHVILLE = {
     "strat_name": "Smithville",
@@ -164,3 +176,89 @@ def test_search_loc_to_mineral(
     assert isinstance(graphs, list)
     assert isinstance(graphs[0], GraphOutput)
     assert isinstance(graphs[0].triplets[0].object, Mineral)
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    n_calls = 0
+
+    async def extract():
+        nonlocal n_calls
+        n_calls += 1
+        await asyncio.sleep(0.05)
+        return n_calls
+
+    async def run():
+        return await asyncio.gather(*[flights.do("key", extract) for _ in range(5)])
+
+    assert asyncio.run(run()) == [1] * 5
+    assert n_calls == 1
+    assert flights.stats["coalesced"] == 4
+    assert flights.stats["in_flight"] == 0
+
+
+def test_pack_paragraphs_within_budget():
+    texts = ["a" * 40, "b" * 40, "c" * 40, "d" * 400]  # ~11, 11, 11, 101 tokens
+    assert pack_paragraphs(texts, token_budget=25) == [[0, 1], [2], [3]]
+    assert pack_paragraphs(texts, token_budget=1000) == [[0, 1, 2, 3]]
+
+
+def test_split_packed_output():
+    raw_llm_output = '{"triplets": [{"location": "Minnesota", "relationship": "in", "stratigraphic_name": "Shakopee", "paragraph_id": "p1"}, {"location": "Arkansas", "relationship": "in", "stratigraphic_name": "Everton", "paragraph_id": "[p2]"}]}'
+    split = split_packed_output(raw_llm_output, ["p1", "p2", "p3"])
+
+    assert json.loads(split["p1"])["triplets"][0]["location"] == "Minnesota"
+    assert json.loads(split["p2"])["triplets"][0]["location"] == "Arkansas"
+    assert json.loads(split["p3"]) == {"triplets": []}
+    assert "paragraph_id" not in json.loads(split["p1"])["triplets"][0]
+
+
+def test_split_packed_output_keeps_text_as_is():
+    raw_llm_output = json.dumps(
+        {
+            "triplets": [
+                {
+                    "location": "Saint-Rémi, Québec",
+                    "relationship": 'is "near"',
+                    "stratigraphic_name": "Beekmantown",
+                    "paragraph_id": "p1",
+                }
+            ]
+        }
+    )
+    split = split_packed_output(raw_llm_output, ["p1"])
+
+    assert "Québec" in split["p1"]
+    triplet = json.loads(split["p1"])["triplets"][0]
+    assert triplet["location"] == "Saint-Rémi, Québec"
+    assert triplet["relationship"] == 'is "near"'
+
+
+def test_split_packed_output_rejects_malformed_triplets():
+    raw_llm_output = '{"triplets": ["Shakopee", {"location": "Minnesota", "relationship": "in", "stratigraphic_name": "Shakopee", "paragraph_id": "p1"}]}'
+    split = split_packed_output(raw_llm_output, ["p1", "p2"])
+    assert len(json.loads(split["p1"])["triplets"]) == 1
+
+    with pytest.raises(ValueError):
+        split_packed_output('{"triplets": "none"}', ["p1", "p2"])
+
+
+@pytest.mark.parametrize(
+    "content, n_cached", [('{"triplets": []}', 1), ("Sure! Here are the", 0)]
+)
+def test_cached_query_llm_only_caches_json(
+    content, n_cached, fake_ollama, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("OLLAMA_URL", fake_ollama(content=content))
+    monkeypatch.setenv("LLM_CACHE_SQLITE", str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.delenv("OLLAMA_URLS", raising=False)
+    monkeypatch.delenv("USE_LLM_QUEUE", raising=False)
+    get_completion_cache.cache_clear()
+
+    messages = [{"role": "user", "content": "Shakopee formation is in Minnesota."}]
+    raw_output = asyncio.run(
+        cached_query_llm(OpenSourceModel.MIXTRAL, messages, 0.0, "v3", stream=False)
+    )
+    assert raw_output == content
+    assert get_completion_cache().stats["entries"] == n_cached
+    get_completion_cache.cache_clear()
@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from text2graph.macrostrat import (
+    EntityType,
+    MacrostratClient,
+    MacrostratMirror,
+    MacrostratSnapshotError,
+    OccurrenceMatcher,
+    build_mirror,
+    find_all_occurrences,
+    get_macrostrat_client,
+    get_records,
+    get_table,
+    load_snapshot,
+    refresh_snapshot,
+    save_snapshot,
+)
+
+
+def test_find_all_occurrences():
+    text = "The Shakopee Fm overlies the Oneota Dolomite; Shakopee Fmx is not a match."
+    words = ["Oneota Dolomite", "Shakopee Fm", "Shakopee"]
+
+    occurrences = find_all_occurrences(text, words)
+    assert [(x["word"], x["start"], x["end"]) for x in occurrences] == [
+        ("Shakopee Fm", 4, 15),
+        ("Shakopee", 4, 12),
+        ("Oneota Dolomite", 29, 44),
+        ("Shakopee", 46, 54),
+    ]
+    assert occurrences[0]["link"].endswith("query=Shakopee%20Fm")
+
+
+def test_occurrence_matcher_ignore_case():
+    matcher = OccurrenceMatcher(["Gallium", "zinc"], ignore_case=True)
+    occurrences = matcher.find_all("GALLIUM and Zinc, not zincite.")
+    assert [x["word"] for x in occurrences] == ["gallium", "zinc"]
+
+
+def test_occurrence_matcher_word_boundaries():
+    # Same as `\b{term}\b`: "(K)" would need word characters on both sides
+    matcher = OccurrenceMatcher(["(K)", "K", "a-b"])
+    occurrences = matcher.find_all("x(K) (K) a-b-c")
+    assert [(x["word"], x["start"]) for x in occurrences] == [
+        ("K", 2),
+        ("K", 6),
+        ("a-b", 9),
+    ]
+
+
+def test_refresh_snapshot_conditional(tmp_path, fake_macrostrat):
+    fake_macrostrat.tables["minerals"] = [{"mineral_id": 1, "mineral": "quartz"}]
+
+    assert refresh_snapshot("minerals", tmp_path, base_url=fake_macrostrat.base_url)
+    snapshot = load_snapshot("minerals", tmp_path)
+    assert snapshot["v"] == 2
+    assert snapshot["data"] == [{"mineral_id": 1, "mineral": "quartz"}]
+
+    # Unchanged table: 304, nothing downloaded or rewritten
+    assert not refresh_snapshot("minerals", tmp_path, base_url=fake_macrostrat.base_url)
+    assert fake_macrostrat.requests["minerals"] == 2
+
+    fake_macrostrat.tables["minerals"].append({"mineral_id": 2, "mineral": "gallium"})
+    assert refresh_snapshot("minerals", tmp_path, base_url=fake_macrostrat.base_url)
+    assert len(load_snapshot("minerals", tmp_path)["data"]) == 2
+
+
+def test_save_snapshot_concurrent_writers(tmp_path):
+    snapshots = [
+        {"table": "minerals", "v": i, "data": [{"mineral_id": i}]} for i in range(8)
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda s: save_snapshot("minerals", s, tmp_path), snapshots))
+
+    # One whole snapshot wins, no temporary file is left behind
+    assert [p.name for p in tmp_path.iterdir()] == ["minerals.json.gz"]
+    assert load_snapshot("minerals", tmp_path) in snapshots
+
+
+def test_get_table_offline(tmp_path, monkeypatch):
+    monkeypatch.setenv("MACROSTRAT_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setenv("MACROSTRAT_OFFLINE", "1")
+    get_table.cache_clear()
+
+    with pytest.raises(MacrostratSnapshotError, match="MACROSTRAT_OFFLINE"):
+        get_table("intervals")
+
+    save_snapshot("intervals", {"v": 2, "data": [{"int_id": 1}]})
+    assert get_table("intervals")["data"] == [{"int_id": 1}]
+    get_table.cache_clear()
+
+
+@pytest.fixture
+def mirror_snapshots(tmp_path):
+    tables = {
+        "strat_names": [
+            {"strat_name_id": 1, "strat_name": "Shakopee", "rank": "Fm"},
+            {"strat_name_id": 2, "strat_name": "Shakopee Dolomite", "rank": "Fm"},
+            {"strat_name_id": 3, "strat_name": "St. Peter", "rank": "Fm"},
+        ],
+        "minerals": [{"mineral_id": 7, "mineral": "quartz"}],
+        "lithologies": [{"lith_id": 9, "name": "sandstone", "class": "sedimentary"}],
+    }
+    for table, data in tables.items():
+        save_snapshot(table, {"v": 2, "data": data}, tmp_path)
+    return tmp_path
+
+
+def test_mirror_lookups(mirror_snapshots):
+    mirror = MacrostratMirror(
+        build_mirror(mirror_snapshots / "m.sqlite", mirror_snapshots)
+    )
+
+    assert [
+        x["strat_name_id"]
+        for x in mirror.get_records(EntityType.STRAT_NAME, "shakopee")
+    ] == [1]
+    assert mirror.get_records(EntityType.STRAT_NAME, "shakopee", exact=True) == []
+    assert [
+        x["strat_name_id"] for x in mirror.get_records(EntityType.STRAT_NAME, "Shak")
+    ] == [1, 2]
+    assert (
+        mirror.get_records(EntityType.STRAT_NAME, "St_") == []
+    )  # LIKE wildcards are escaped
+
+    quartz = mirror.get_records(EntityType.MINERAL, "quartz", exact=True)
+    assert quartz == [{"mineral_id": 7, "mineral": "quartz", "macrostrat_version": 2}]
+    assert mirror.get_record(EntityType.LITHOLOGY, 9)["class"] == "sedimentary"
+
+
+def test_build_mirror_concurrent_builders(mirror_snapshots, tmp_path_factory):
+    path = tmp_path_factory.mktemp("mirror") / "m.sqlite"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: build_mirror(path, mirror_snapshots), range(4)))
+
+    # A failed build neither replaces the mirror nor leaves its temporary file behind
+    with pytest.raises(MacrostratSnapshotError):
+        build_mirror(path, tmp_path_factory.mktemp("empty"))
+
+    assert [p.name for p in path.parent.iterdir()] == ["m.sqlite"]
+    mirror = MacrostratMirror(path)
+    assert mirror.get_record(EntityType.MINERAL, 7)["mineral"] == "quartz"
+
+
+def test_get_records_from_mirror(mirror_snapshots, monkeypatch):
+    build_mirror(mirror_snapshots / "m.sqlite", mirror_snapshots)
+    monkeypatch.setenv("MACROSTRAT_MIRROR_SQLITE", str(mirror_snapshots / "m.sqlite"))
+    monkeypatch.setenv("MACROSTRAT_OFFLINE", "1")  # Must not reach the network
+
+    records = asyncio.run(get_records(EntityType.STRAT_NAME, "St. Peter"))
+    assert records[0]["strat_name_id"] == 3
+
+
+def test_macrostrat_client_retries(fake_macrostrat):
+    fake_macrostrat.tables["minerals"] = [{"mineral_id": 7, "mineral": "quartz"}]
+    fake_macrostrat.failures = 2
+
+    async def main():
+        client = MacrostratClient(base_url=fake_macrostrat.base_url, retries=2)
+        try:
+            return await client.get_json("/defs/minerals", params={"mineral": "quartz"})
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main())["success"]["data"][0]["mineral_id"] == 7
+    assert fake_macrostrat.requests["minerals"] == 3
+
+
+def test_macrostrat_client_gives_up(fake_macrostrat):
+    fake_macrostrat.failures = 10
+
+    async def main():
+        client = MacrostratClient(base_url=fake_macrostrat.base_url, retries=1)
+        try:
+            await client.get_json("/defs/minerals")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
+    assert fake_macrostrat.requests["minerals"] == 2
+
+
+def test_macrostrat_client_closed_with_its_loop():
+    async def get_client():
+        return get_macrostrat_client()
+
+    # The client of a finished loop is closed, the next loop gets its own
+    first = asyncio.run(get_client())
+    assert first.client.is_closed
+    second = asyncio.run(get_client())
+    assert second is not first
+    assert second.client.is_closed
@@ -1,3 +1,8 @@
+import pytest
+
+from text2graph.prompt import PromptLayout, get_prompt_handler
+
+
 def test_strat_prompt_handler_v3(text, stratname_prompt_handler_v3):
     handler = stratname_prompt_handler_v3
 
@@ -31,3 +36,25 @@ def test_mineral_prompt_handler_v0(text, mineral_prompt_handler_v0):
     assert messages[0]["content"] == sys_prompt
     assert messages[1]["role"] == "user"
     assert messages[1]["content"] == user_prompt
+
+
+def test_packed_gpt_messages(stratname_prompt_handler_v3):
+    messages = stratname_prompt_handler_v3.get_packed_gpt_messages(
+        {"p1": "Shakopee Formation is in Minnesota.", "p2": "Everton is in Arkansas."}
+    )
+    assert len(messages) == 2
+    assert "paragraph_id" in messages[0]["content"]
+    assert "[p1] Shakopee Formation is in Minnesota." in messages[1]["content"]
+    assert "[p2] Everton is in Arkansas." in messages[1]["content"]
+
+
+@pytest.mark.parametrize("prompt_version", ["stratname_v3", "mineral_v0"])
+def test_prefix_cache_layout_has_static_system_prompt(text, prompt_version):
+    handler = get_prompt_handler(prompt_version)
+    layout = PromptLayout.PREFIX_CACHE
+
+    messages = handler.get_gpt_messages(text, layout=layout)
+    other_messages = handler.get_gpt_messages("Gold is in Nevada.", layout=layout)
+    assert messages[0] == other_messages[0]
+    assert messages[1]["content"].startswith("KNOWN")
+    assert messages[1]["content"].endswith(handler.get_user_prompt(text))
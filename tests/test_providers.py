@@ -0,0 +1,88 @@
+import asyncio
+
+from text2graph.providers import AnthropicProvider, OllamaProvider, ProviderRegistry
+from text2graph.utils import JSONStreamValidator
+
+
+def test_to_anthropic_kwargs_does_not_mutate_messages():
+    messages = [
+        {"role": "system", "content": "You are a geology expert."},
+        {"role": "user", "content": "Shakopee formation is in Minnesota."},
+    ]
+    kwargs = AnthropicProvider.to_anthropic_kwargs(messages)
+
+    assert len(messages) == 2
+    assert kwargs["system"] == "You are a geology expert."
+    assert kwargs["messages"] == [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "Shakopee formation is in Minnesota."}
+            ],
+        }
+    ]
+
+
+def test_provider_registry_reuses_providers(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+
+    async def get_twice():
+        registry = ProviderRegistry()
+        first, second = registry.get("ollama"), registry.get("ollama")
+        await registry.aclose()
+        return first, second
+
+    first, second = asyncio.run(get_twice())
+    assert first is second
+
+
+def test_provider_semaphore_shared_by_callers(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+
+    async def get_semaphores():
+        registry = ProviderRegistry()
+        provider = registry.get("ollama")
+        semaphores = provider.semaphore, registry.get("ollama").semaphore
+        await registry.aclose()
+        return provider, semaphores
+
+    provider, (first, second) = asyncio.run(get_semaphores())
+    assert first is second
+    assert first._value == provider.max_concurrency
+
+
+def test_provider_registry_closes_providers_of_previous_loop(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+    registry = ProviderRegistry()
+
+    async def get_provider():
+        return registry.get("ollama")
+
+    # Providers are closed with the loop that opened them, and replaced on the next one
+    first = asyncio.run(get_provider())
+    assert first.client.is_closed
+    second = asyncio.run(get_provider())
+    assert first is not second
+    assert second.client.is_closed
+
+
+def test_json_stream_validator_stops_at_top_level_close():
+    validator = JSONStreamValidator()
+    chunks = ['Sure! {"triplets": [{"location": "a \\" }]', '"}]}', " trailing }"]
+
+    assert not validator.feed(chunks[0])
+    assert validator.feed(chunks[1])
+    assert validator.text == '{"triplets": [{"location": "a \\" }]"}]}'
+
+
+def test_complete_json_cancels_stream_after_json_closes(fake_ollama):
+    chunks = ['{"triplets": ', "[]", "}", *[" junk"] * 50]
+    provider = OllamaProvider(url=fake_ollama(stream_chunks=chunks))
+
+    async def run():
+        output = await provider.complete_json("mixtral", [])
+        await provider.aclose()
+        return output
+
+    assert asyncio.run(run()) == '{"triplets": []}'
+    assert fake_ollama.servers[0].n_streamed < len(chunks)
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from text2graph.providers import OllamaRouter
+
+MESSAGES = [{"role": "user", "content": "Shakopee formation is in Minnesota."}]
+
+
+def test_router_prefers_faster_endpoint(fake_ollama):
+    router = OllamaRouter(
+        [fake_ollama(latency=0.01), fake_ollama(latency=0.2)],
+        health_check_interval=None,
+    )
+
+    async def run():
+        await asyncio.gather(
+            *[router.complete("mixtral", MESSAGES) for _ in range(4)]
+        )  # Warm up latency estimates on both endpoints
+        for _ in range(10):
+            await router.complete("mixtral", MESSAGES)
+        await router.aclose()
+
+    asyncio.run(run())
+    fast, slow = router.endpoints
+    assert fast.n_requests > slow.n_requests
+    assert router.stats.requests == 14
+    assert router.stats.connections == (
+        fast.provider.stats.connections + slow.provider.stats.connections
+    )
+
+
+def test_router_ejects_failing_endpoint(fake_ollama):
+    router = OllamaRouter(
+        [fake_ollama(status=500), fake_ollama()],
+        max_failures=1,
+        health_check_interval=None,
+    )
+    # Make the broken endpoint look attractive
+    router.endpoints[0].ewma_latency = 0.01
+    router.endpoints[1].ewma_latency = 10.0
+
+    async def run():
+        outputs = [await router.complete("mixtral", MESSAGES) for _ in range(5)]
+        await router.aclose()
+        return outputs
+
+    outputs = asyncio.run(run())
+
+    assert outputs == ['{"triplets": []}'] * 5
+    assert router.endpoints[0].n_requests == 1
+    assert router.endpoints[0].to_dict()["ejected"]
+
+
+def test_router_does_not_fail_over_on_client_errors(fake_ollama):
+    router = OllamaRouter(
+        [fake_ollama(status=404), fake_ollama(status=404)],
+        max_failures=1,
+        health_check_interval=None,
+    )
+
+    async def run():
+        try:
+            await router.complete("unknown-model", MESSAGES)
+        finally:
+            await router.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+    # A bad request is not the endpoint's fault, it is neither retried elsewhere nor ejected
+    assert sum(endpoint.n_requests for endpoint in router.endpoints) == 1
+    assert not any(endpoint.to_dict()["ejected"] for endpoint in router.endpoints)
+
+
+def test_router_health_check_ejects_unreachable_endpoint(fake_ollama):
+    router = OllamaRouter(
+        [fake_ollama(status=500), fake_ollama()], health_check_interval=None
+    )
+
+    async def run():
+        await router.health_check()
+        await router.complete("mixtral", MESSAGES)
+        await router.aclose()
+
+    asyncio.run(run())
+
+    assert router.endpoints[0].n_requests == 0
+    assert router.endpoints[1].n_requests == 1
@@ -1,45 +1,340 @@
-from functools import cache
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from functools import cache, cached_property
 from importlib.resources import files
 from pathlib import Path
+from typing import NamedTuple
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sentence_transformers.util import pairwise_cos_sim
-
-from text2graph.macrostrat import EntityType, get_all_mineral_names, get_all_strat_names
+from dotenv import load_dotenv
+
+from text2graph.ann import (
+    ANNIndex,
+    build_ann_index,
+    load_ann_index,
+    normalize,
+    save_ann_index,
+)
+from text2graph.embedding_store import (
+    closest_rows,
+    is_embedding_store,
+    load_embedding_store,
+    save_embedding_store,
+    top_k_rows,
+)
+from text2graph.encoders import Encoder, EncoderBackend, get_encoder
+from text2graph.lexical import TrigramIndex, canonical_name
+from text2graph.macrostrat import (
+    EntityType,
+    get_all_mineral_names,
+    get_all_strat_names,
+)
 from text2graph.usgs import CRITICAL_MINERALS
+from text2graph.utils import write_atomic
+
+load_dotenv()
+
+DEFAULT_MEMO_SIZE = 100_000
+
+# Versioned artifacts: `<model dir>/versions/<version>/`, published through `<model dir>/CURRENT`
+VERSIONS_DIR = "versions"
+CURRENT_VERSION_FILE = "CURRENT"
+
+# Opt-in lexical rescue of names whose best embedding match is just below the threshold
+LEXICAL_THRESHOLD = 0.7  # Trigram Jaccard similarity
+LEXICAL_MARGIN = 0.0  # How far below the embedding threshold a lexical match may score, 0 disables the rescue
+N_LEXICAL_CANDIDATES = 32
+
+
+class AlignmentCandidate(NamedTuple):
+    """A known entity that may match a name, with its embedding cosine and trigram Jaccard similarity."""
+
+    name: str
+    score: float
+    lexical_score: float
+
+
+class AlignmentMemo:
+    """Size-bounded LRU memo of embedding alignment results: (name, threshold) -> (closest, score).
+
+    `closest` is None when no known entity reached the threshold.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MEMO_SIZE) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict[tuple[str, float], tuple[str | None, float]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, name: str, threshold: float) -> tuple[str | None, float] | None:
+        with self._lock:
+            entry = self.entries.get((name, threshold))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((name, threshold))
+            self.hits += 1
+            return entry
+
+    def put(
+        self, name: str, threshold: float, closest: str | None, score: float
+    ) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self.entries[(name, threshold)] = (closest, score)
+            self.entries.move_to_end((name, threshold))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def save(self, path: Path, version: str) -> None:
+        """Atomically write the memo as JSON, least recently used first."""
+
+        with self._lock:
+            entries = [[*key, *value] for key, value in self.entries.items()]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(
+            path,
+            json.dumps({"version": version, "entries": entries}, ensure_ascii=False),
+        )
+
+    def load(self, path: Path, version: str) -> None:
+        """Warm the memo from a file written for the same `version`, if any.
+
+        An unreadable or corrupt file is logged and ignored, starting with an empty memo.
+        """
+
+        if not path.is_file():
+            return
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data["version"] != version:
+                logging.info(f"Ignoring alignment memo {path} of another version")
+                return
+            entries = [
+                (str(name), float(threshold), closest, float(score))
+                for name, threshold, closest, score in data["entries"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring corrupt alignment memo {path}: {e}")
+            return
+        for name, threshold, closest, score in entries:
+            self.put(name, threshold, closest, score)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"memo_hits": self.hits, "memo_size": len(self.entries)}
 
 
 class AlignmentHandler:
     def __init__(
         self,
         entity_type: EntityType,
-        known_entity_names: list[str],
+        known_entity_names: Sequence[str],
         known_entity_embeddings: np.ndarray | None = None,
         model_name: str = "all-MiniLM-L6-v2",
         device: str = "cpu",
+        ann_index: ANNIndex | None = None,
+        embeddings_normalized: bool = False,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+        encoder_backend: EncoderBackend | str = EncoderBackend.TORCH,
+        lexical_threshold: float = LEXICAL_THRESHOLD,
+        lexical_margin: float = LEXICAL_MARGIN,
     ) -> None:
         self.entity_type = entity_type
         self.known_entity_names = known_entity_names
         self.known_entity_embeddings = known_entity_embeddings
         self.model_name = model_name
 
-        self.model = SentenceTransformer(model_name, device=device)
+        self.device = device
+        self.encoder_backend = EncoderBackend(encoder_backend)
+        self._encoder: Encoder | None = None
 
         # Instantiate from scratch
         if self.known_entity_embeddings is None:
-            self.known_entity_embeddings = self.model.encode(self.known_entity_names)
+            self.known_entity_embeddings = self.encoder.encode(
+                list(self.known_entity_names)
+            )
 
         assert len(self.known_entity_names) == len(self.known_entity_embeddings)
 
+        # Unit-length vectors, so that cosine similarity is a plain matrix product
+        if embeddings_normalized:
+            self.normalized_embeddings = self.known_entity_embeddings
+        else:
+            self.normalized_embeddings = normalize(self.known_entity_embeddings)
+        self.ann_index = ann_index
+
+        # Lexical rescue: trigram similarity required, and how far below the threshold the embedding may score
+        self.lexical_threshold = lexical_threshold
+        self.lexical_margin = lexical_margin
+
+        self.memo = AlignmentMemo(max_size=memo_size)
+        self.memo_path: Path | None = None
+
+        # Alignment metrics
+        self.exact_hits = 0
+        self.canonical_hits = 0
+        self.lexical_hits = 0
+        self.encoder_lookups = 0
+
+    @property
+    def encoder(self) -> Encoder:
+        """Shared encoder, only loaded once a name needs to be encoded."""
+
+        if self._encoder is None:
+            self._encoder = get_encoder(
+                self.encoder_backend, self.model_name, device=self.device
+            )
+        return self._encoder
+
+    @cached_property
+    def name_index(self) -> dict[str, int]:
+        """Known entity name to its (first) index."""
+
+        index = {}
+        for i, name in enumerate(self.known_entity_names):
+            index.setdefault(name, i)
+        return index
+
+    @cached_property
+    def canonical_name_index(self) -> dict[str, int | None]:
+        """Canonical name to the index of its known entity, or None if several known entities share it."""
+
+        index: dict[str, int | None] = {}
+        for i, name in enumerate(self.known_entity_names):
+            key = canonical_name(name)
+            if key not in index:
+                index[key] = i
+            elif index[key] is not None and self.known_entity_names[index[key]] != name:
+                index[key] = None
+        return index
+
+    @cached_property
+    def trigram_index(self) -> TrigramIndex:
+        return TrigramIndex(self.known_entity_names)
+
+    def _rescore(self, x: np.ndarray, ids: list[int]) -> np.ndarray:
+        """Cosine similarity of a unit query to the given known entities."""
+        return np.asarray(self.normalized_embeddings[ids], dtype=np.float32) @ x
+
+    def _lexical_match(
+        self, name: str, x: np.ndarray, threshold: float
+    ) -> tuple[str, float] | None:
+        """Known entity spelled almost like `name` whose embedding is close enough, for spelling and OCR variants.
+
+        Returns the entity and its embedding cosine similarity.
+        """
+
+        candidates = [
+            (i, lexical_score)
+            for i, lexical_score in self.trigram_index.search(
+                name, N_LEXICAL_CANDIDATES
+            )
+            if lexical_score >= self.lexical_threshold
+        ]
+        if not candidates:
+            return None
+
+        scores = self._rescore(x, [i for i, _ in candidates])
+        best = int(np.argmax(scores))
+        if scores[best] < threshold - self.lexical_margin:
+            return None
+        self.lexical_hits += 1
+        return self.known_entity_names[candidates[best][0]], float(scores[best])
+
+    def match_known_entity(self, name: str) -> str | None:
+        """Resolve exact and canonical-form matches without the encoder."""
+
+        if name in self.name_index:
+            self.exact_hits += 1
+            return name
+
+        idx = self.canonical_name_index.get(canonical_name(name))
+        if idx is not None:
+            self.canonical_hits += 1
+            return self.known_entity_names[idx]
+        return None
+
+    @cached_property
+    def known_entity_set_version(self) -> str:
+        """Hash of the alignment version, model, encoder backend and known entity names, which results depend on."""
+
+        h = hashlib.sha256(
+            f"{self.version}:{self.model_name}:{self.encoder_backend.value}".encode()
+        )
+        for name in self.known_entity_names:
+            h.update(b"\n" + name.encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    @property
+    def memo_version(self) -> str:
+        """Memoized alignments also depend on the lexical rescue parameters."""
+        return f"{self.known_entity_set_version}:{self.lexical_threshold}:{self.lexical_margin}"
+
+    def load_memo(self, directory: str | Path) -> None:
+        """Warm the memo from `directory`, and remember where to save it."""
+
+        self.memo_path = (
+            Path(directory)
+            / self.entity_type.value
+            / self.model_name
+            / f"{self.known_entity_set_version}.json"
+        )
+        self.memo.load(self.memo_path, self.memo_version)
+
+    def save_memo(self) -> None:
+        if self.memo_path is not None:
+            self.memo.save(self.memo_path, self.memo_version)
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """Counters of how names were aligned."""
+
+        memo_hits = self.memo.hits
+        total = self.exact_hits + self.canonical_hits + memo_hits + self.encoder_lookups
+        return {
+            "exact_hits": self.exact_hits,
+            "canonical_hits": self.canonical_hits,
+            "lexical_hits": self.lexical_hits,
+            **self.memo.stats,
+            "encoder_lookups": self.encoder_lookups,
+            "fast_path_ratio": (total - self.encoder_lookups) / total if total else 0.0,
+        }
+
     @property
     def default_save_path(self) -> Path:
         return Path(
             f"text2graph/binaries/known_entity_embeddings/{self.entity_type.value}/{self.model_name}"
         )
 
-    def save(self, path: str | Path | None = None) -> None:
-        """Save handler to disk."""
+    def save(
+        self,
+        path: str | Path | None = None,
+        ann_index_kind: str = "ivf",
+        keep_versions: int = 2,
+    ) -> None:
+        """Save handler to disk as a new version, with an ANN index of `ann_index_kind` ("ivf" or "hnsw").
+
+        Each version is written to its own `versions/<known_entity_set_version>` directory, then published by
+        atomically replacing the `CURRENT` pointer, so readers never see a partial artifact. Only the newest
+        `keep_versions` versions are kept.
+        """
 
         if path is None:
             path = self.default_save_path
@@ -47,12 +342,54 @@ class AlignmentHandler:
         if isinstance(path, str):
             path = Path(path)
 
-        path.mkdir(parents=True, exist_ok=True)
+        version = self.known_entity_set_version
+        versions_path = path / VERSIONS_DIR
+        version_path = versions_path / version
+        if not version_path.is_dir():
+            # A hidden directory per writer, so that concurrent saves never touch each other's files
+            versions_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = Path(
+                tempfile.mkdtemp(
+                    dir=versions_path, prefix=f".{version}.", suffix=".tmp"
+                )
+            )
+            try:
+                tmp_path.chmod(versions_path.stat().st_mode & 0o777)
+                self._save_artifact(tmp_path, ann_index_kind)
+                try:
+                    os.replace(tmp_path, version_path)
+                except OSError:
+                    if not version_path.is_dir():
+                        raise
+                    # Another writer published the same version meanwhile
+            finally:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        # Publish the new version
+        write_atomic(path / CURRENT_VERSION_FILE, version + "\n")
+
+        # Human-readable copy of the current lexicon next to the versions
+        write_atomic(path / "model.txt", self.model_name + "\n")
+        write_atomic(
+            path / "known_entity_names.txt",
+            "".join(name + "\n" for name in self.known_entity_names),
+        )
 
-        # Purge existing files
-        for file in path.glob("*"):
-            file.unlink()
+        # Prune old versions; processes still mapping them keep their open files
+        os.utime(version_path)
+        older_versions = sorted(
+            (
+                p
+                for p in versions_path.iterdir()
+                if p != version_path and not p.name.startswith(".")
+            ),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+        for old_version in older_versions[max(keep_versions - 1, 0) :]:
+            shutil.rmtree(old_version)
 
+    def _save_artifact(self, path: Path, ann_index_kind: str) -> None:
         # Save model name
         with open(path / "model.txt", "w") as f:
             f.write(self.model_name + "\n")
@@ -63,11 +400,55 @@ class AlignmentHandler:
             for name in self.known_entity_names:
                 f.write(name + "\n")
 
-        # Save known entity embeddings
+        # Save known entity embeddings as a memory-mappable store
         assert self.known_entity_embeddings is not None
-        np.savez(
-            path / "known_entity_embeddings.npz",
-            embeddings=self.known_entity_embeddings,
+        save_embedding_store(
+            path, self.known_entity_names, self.known_entity_embeddings
+        )
+
+        # Save ANN index, built on the stored (float16) vectors it will search
+        _, stored_embeddings = load_embedding_store(path)
+        if self.ann_index is None or self.ann_index.kind != ann_index_kind:
+            self.ann_index = build_ann_index(
+                np.asarray(stored_embeddings, dtype=np.float32), ann_index_kind
+            )
+        self.ann_index.embeddings = stored_embeddings
+        save_ann_index(self.ann_index, path)
+
+    def refresh(self, known_entity_names: Sequence[str]) -> "AlignmentHandler":
+        """Handler for an updated lexicon that reuses the embeddings of names it already knows.
+
+        Only added names are encoded, and removed names are dropped.
+        """
+
+        new_names = list(dict.fromkeys(known_entity_names))
+        kept = [j for j, name in enumerate(new_names) if name in self.name_index]
+        added = [j for j, name in enumerate(new_names) if name not in self.name_index]
+        n_removed = len(self.name_index) - len(kept)
+        logging.info(
+            f"Refreshing {self.entity_type.value}: {len(kept)} kept, {len(added)} added, {n_removed} removed"
+        )
+
+        embeddings = np.zeros(
+            (len(new_names), self.normalized_embeddings.shape[1]), dtype=np.float32
+        )
+        if kept:
+            old_idx = [self.name_index[new_names[j]] for j in kept]
+            embeddings[kept] = self.normalized_embeddings[old_idx]
+        if added:
+            embeddings[added] = normalize(
+                self.encoder.encode([new_names[j] for j in added])
+            )
+
+        return AlignmentHandler(
+            entity_type=self.entity_type,
+            known_entity_names=new_names,
+            known_entity_embeddings=embeddings,
+            model_name=self.model_name,
+            device=self.device,
+            embeddings_normalized=True,
+            memo_size=self.memo.max_size,
+            encoder_backend=self.encoder_backend,
         )
 
     @classmethod
@@ -76,84 +457,223 @@ class AlignmentHandler:
         entity_type: EntityType,
         model_name: str = "all-MiniLM-L6-v2",
         device: str = "cpu",
+        encoder_backend: EncoderBackend | str = EncoderBackend.TORCH,
     ) -> "AlignmentHandler":
-        """Load handler from disk."""
+        """Load handler from disk.
+
+        Embeddings and names saved as an embedding store are memory-mapped, so processes loading the same
+        handler share their pages. Older `.npz` embeddings are read into memory.
+        """
 
         path = (
             files("text2graph.binaries.known_entity_embeddings")
             / entity_type.value
             / model_name
         )
+
+        # Current version, if saved as versioned artifacts
+        current_version_file = path / CURRENT_VERSION_FILE
+        if current_version_file.is_file():
+            with open(current_version_file, "r") as f:  # type: ignore
+                path = path / VERSIONS_DIR / f.readline().strip()
+
         model_name_file = path / "model.txt"
-        known_entity_names_file = path / "known_entity_names.txt"
-        known_entity_embeddings_file = str(path / "known_entity_embeddings.npz")
 
         # Load model name
         with open(model_name_file, "r") as f:  # type: ignore
             model_name = f.readline().strip()
 
-        # Load known entities
-        with open(known_entity_names_file, "r") as f:  # type: ignore
-            known_entity_names = [line.strip() for line in f.readlines()]
-
-        # Load known entity embeddings
-        known_entity_embeddings = np.load(known_entity_embeddings_file)["embeddings"]
-
-        return cls(
+        if is_embedding_store(path):  # type: ignore
+            known_entity_names, known_entity_embeddings = load_embedding_store(path)  # type: ignore
+            embeddings_normalized = True
+        else:
+            # Load known entities
+            with open(path / "known_entity_names.txt", "r") as f:  # type: ignore
+                known_entity_names = [line.strip() for line in f.readlines()]
+
+            # Load known entity embeddings
+            known_entity_embeddings = np.load(
+                str(path / "known_entity_embeddings.npz")
+            )["embeddings"]
+            embeddings_normalized = False
+
+        handler = cls(
             entity_type=entity_type,
             known_entity_names=known_entity_names,
             known_entity_embeddings=known_entity_embeddings,
             model_name=model_name,
             device=device,
+            embeddings_normalized=embeddings_normalized,
+            encoder_backend=encoder_backend,
         )
 
+        # Load ANN index, if one was saved with the embeddings
+        handler.ann_index = load_ann_index(path, handler.normalized_embeddings)  # type: ignore
+        return handler
+
     def get_closest_known_entity(self, name: str, threshold: float = 0.95) -> str:
         """Get the closest known entity to a given name or return itself if not found."""
-
-        x = self.model.encode([name])
-        similarity = pairwise_cos_sim(x, self.known_entity_embeddings)  # type: ignore
-        idx_closest = np.argmax(similarity)
-
-        if similarity[idx_closest] < threshold:
-            return name
-        return self.known_entity_names[idx_closest]
+        return self.get_closest_known_entities([name], threshold=threshold)[0]
+
+    def get_closest_known_entities(
+        self, names: list[str], threshold: float = 0.95
+    ) -> list[str]:
+        """Batched `get_closest_known_entity`.
+
+        Exact and canonical-form matches are resolved from a hash index. The remaining names are encoded in one
+        forward pass and scored with one matrix product. With a positive `lexical_margin`, a name below the
+        threshold can still match a known entity spelled almost the same way (trigram similarity of at least
+        `lexical_threshold`) whose embedding is within `lexical_margin` of the threshold.
+        """
+
+        closests = [self.match_known_entity(name) for name in names]
+
+        # Memoized embedding alignments
+        unknown = []
+        for i, closest in enumerate(closests):
+            if closest is not None:
+                continue
+            entry = self.memo.get(names[i], threshold)
+            if entry is None:
+                unknown.append(i)
+            else:
+                closests[i] = entry[0] or names[i]
+        if not unknown:
+            return closests  # type: ignore
+
+        # Encode each distinct unknown name once
+        pending = list(dict.fromkeys(names[i] for i in unknown))
+        self.encoder_lookups += len(pending)
+        x = np.asarray(
+            self.encoder.encode(pending, normalize_embeddings=True), dtype=np.float32
+        )
+        if self.ann_index is not None:
+            # Only scores candidates that can reach the threshold
+            indices, scores = self.ann_index.search(x, k=1, min_similarity=threshold)
+            idx_closest, scores = indices[:, 0], scores[:, 0]
+        else:
+            idx_closest, scores = closest_rows(x, self.normalized_embeddings)
+
+        aligned = {}
+        for name, x_name, idx, score in zip(pending, x, idx_closest, scores):
+            closest, score = None, float(max(score, -1.0))
+            if score >= threshold:
+                closest = self.known_entity_names[idx]
+            elif self.lexical_margin > 0 and (
+                rescued := self._lexical_match(name, x_name, threshold)
+            ):
+                closest, score = rescued
+            self.memo.put(name, threshold, closest, score)
+            aligned[name] = closest or name
+        for i in unknown:
+            closests[i] = aligned[names[i]]
+        return closests  # type: ignore
+
+    def get_candidates(
+        self, names: list[str], k: int = 5
+    ) -> list[list[AlignmentCandidate]]:
+        """Top-k known entities for each name, best first.
+
+        Candidates are the trigram and embedding neighbours of the name, re-scored by embedding cosine similarity.
+        """
+
+        if not names:
+            return []
+
+        self.encoder_lookups += len(names)
+        x = np.asarray(
+            self.encoder.encode(names, normalize_embeddings=True), dtype=np.float32
+        )
+        if self.ann_index is not None:
+            semantic_idx, _ = self.ann_index.search(x, k=k)
+        else:
+            semantic_idx, _ = top_k_rows(x, self.normalized_embeddings, k=k)
+
+        candidates = []
+        for name, x_name, semantic in zip(names, x, semantic_idx):
+            lexical = dict(self.trigram_index.search(name, N_LEXICAL_CANDIDATES))
+            ids = list(lexical.keys() | {int(i) for i in semantic if i >= 0})
+            scores = self._rescore(x_name, ids)
+            ranked = sorted(zip(ids, scores), key=lambda x: -x[1])[:k]
+            candidates.append(
+                [
+                    AlignmentCandidate(
+                        name=self.known_entity_names[i],
+                        score=float(score),
+                        lexical_score=lexical.get(i, 0.0),
+                    )
+                    for i, score in ranked
+                ]
+            )
+        return candidates
 
     @property
     def version(self) -> str:
-        return "v1"
+        return "v2"
 
 
-def _generate_known_entity_embeddings() -> None:
-    """Generate all known entity embeddings for alignment."""
+def _generate_known_entity_embeddings(incremental: bool = True) -> None:
+    """Generate all known entity embeddings for alignment.
 
-    # Stratigraphic names
-    AlignmentHandler(
-        entity_type=EntityType.STRAT_NAME, known_entity_names=get_all_strat_names()
-    ).save()
+    With `incremental`, the saved handlers are refreshed and only names added to the lexicons are encoded.
+    """
 
-    # Minerals
     macrostrat_minerals = get_all_mineral_names()
     usgs_minerals = CRITICAL_MINERALS
-    all_minerals = list(set(macrostrat_minerals + usgs_minerals))
-    AlignmentHandler(
-        entity_type=EntityType.MINERAL, known_entity_names=all_minerals
-    ).save()
+    lexicons = {
+        EntityType.STRAT_NAME: get_all_strat_names(),
+        EntityType.MINERAL: sorted(set(macrostrat_minerals + usgs_minerals)),
+    }
+
+    for entity_type, known_entity_names in lexicons.items():
+        handler = None
+        if incremental:
+            try:
+                handler = AlignmentHandler.load(entity_type).refresh(known_entity_names)
+            except FileNotFoundError:
+                logging.info(
+                    f"No saved {entity_type.value} handler, encoding all names"
+                )
+        if handler is None:
+            handler = AlignmentHandler(
+                entity_type=entity_type, known_entity_names=known_entity_names
+            )
+        handler.save()
 
 
 @cache
 def get_alignment_handler(
-    entity_type: EntityType | str, device: str = "cpu"
+    entity_type: EntityType | str,
+    device: str = "cpu",
+    encoder_backend: EncoderBackend | str | None = None,
 ) -> AlignmentHandler:
     """Get alignment handler for a given entity type.
 
+    `encoder_backend` ("torch", "onnx" or "onnx-int8") defaults to the `ALIGNMENT_ENCODER` environment variable,
+    or "torch" if unset.
+
     Usage:
     get_alignment_handler(EntityType.MINERAL)
     get_alignment_handler("mineral")  # Same as above
 
     get_alignment_handler(EntityType.STRAT_NAME)
     get_alignment_handler("strat_name")  # Same as above
+
+    get_alignment_handler("strat_name", encoder_backend="onnx-int8")  # CPU-optimized encoder
     """
 
     if isinstance(entity_type, str):
         entity_type = EntityType(entity_type)
-    return AlignmentHandler.load(entity_type=entity_type, device=device)
+    if encoder_backend is None:
+        encoder_backend = os.getenv("ALIGNMENT_ENCODER", EncoderBackend.TORCH.value)
+    handler = AlignmentHandler.load(
+        entity_type=entity_type, device=device, encoder_backend=encoder_backend
+    )
+
+    # Alignment memo, persisted across processes if `ALIGNMENT_MEMO_DIR` is set
+    handler.memo.max_size = int(os.getenv("ALIGNMENT_MEMO_SIZE", DEFAULT_MEMO_SIZE))
+    memo_dir = os.getenv("ALIGNMENT_MEMO_DIR")
+    if memo_dir:
+        handler.load_memo(memo_dir)
+        atexit.register(handler.save_memo)
+    return handler
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from text2graph.alignment import AlignmentHandler
+
+
+class AlignmentService:
+    """Micro-batches alignment requests from concurrent coroutines into one encoder call.
+
+    Names are queued until `max_batch_size` names are pending or `max_wait` seconds have passed since the first
+    one, then aligned together on a dedicated worker thread, so the event loop is never blocked by the encoder.
+
+    Usage:
+    service = get_alignment_service(get_alignment_handler("strat_name"))
+    closests = await service.get_closest_known_entities(["Shakopee Fm"])
+    """
+
+    def __init__(
+        self,
+        alignment_handler: AlignmentHandler,
+        max_batch_size: int = 256,
+        max_wait: float = 0.005,
+    ) -> None:
+        self.alignment_handler = alignment_handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        # One worker: the encoder is the bottleneck and batching is what makes it fast
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Pending batch of the loop that scheduled its flush
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pending: list[tuple[list[str], float, asyncio.Future]] = []
+        self._n_pending = 0
+        self._timer: asyncio.TimerHandle | None = None
+        # In-flight batches
+        self._tasks: set[asyncio.Task] = set()
+
+        self.n_batches = 0
+        self.n_names = 0
+
+    async def get_closest_known_entities(
+        self, names: list[str], threshold: float = 0.95
+    ) -> list[str]:
+        """Same as `AlignmentHandler.get_closest_known_entities`, batched with other callers."""
+
+        if not names:
+            return []
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset(loop)
+        future = loop.create_future()
+        self._pending.append((names, threshold, future))
+        self._n_pending += len(names)
+
+        if self._n_pending >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _reset(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Drop the batch of a previous loop, e.g., one shut down before its flush, whose callers are gone."""
+
+        if self._pending:
+            logging.warning(
+                f"Dropping {self._n_pending} names pending on a previous event loop"
+            )
+        if self._timer is not None:
+            self._timer.cancel()
+        self._loop, self._pending, self._n_pending, self._timer = loop, [], 0, None
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._n_pending = self._pending, [], 0
+        if pending:
+            task = asyncio.ensure_future(self._run_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(
+        self, pending: list[tuple[list[str], float, asyncio.Future]]
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        # A batch can only share an encoder call within a threshold
+        by_threshold: dict[float, list[tuple[list[str], asyncio.Future]]] = {}
+        for names, threshold, future in pending:
+            by_threshold.setdefault(threshold, []).append((names, future))
+
+        for threshold, requests in by_threshold.items():
+            names = [name for request_names, _ in requests for name in request_names]
+            self.n_batches += 1
+            self.n_names += len(names)
+            try:
+                closests = await loop.run_in_executor(
+                    self.executor,
+                    self.alignment_handler.get_closest_known_entities,
+                    names,
+                    threshold,
+                )
+            except Exception as error:
+                logging.error(f"Alignment batch of {len(names)} names failed: {error}")
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            start = 0
+            for request_names, future in requests:
+                if not future.done():  # The caller may have been cancelled
+                    future.set_result(closests[start : start + len(request_names)])
+                start += len(request_names)
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "batches": self.n_batches,
+            "names": self.n_names,
+            "mean_batch_size": self.n_names / self.n_batches if self.n_batches else 0.0,
+        }
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_services: dict[AlignmentHandler, AlignmentService] = {}
+
+
+def get_alignment_service(alignment_handler: AlignmentHandler) -> AlignmentService:
+    """Get the process-wide alignment service of a handler, so that all requests share its batches."""
+
+    if alignment_handler not in _services:
+        _services[alignment_handler] = AlignmentService(alignment_handler)
+    return _services[alignment_handler]
+
+
+def get_alignment_stats() -> dict[str, dict[str, int | float]]:
+    return {
+        service.alignment_handler.entity_type.value: service.stats
+        for service in _services.values()
+    }
+
+
+def close_alignment_services() -> None:
+    """Stop the worker threads of all alignment services."""
+
+    for service in _services.values():
+        service.close()
+    _services.clear()
@@ -0,0 +1,309 @@
+"""Approximate nearest neighbour indexes over unit-normalized embeddings (cosine similarity)."""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+INDEX_META_FILE = "ann_index.json"
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (as float32)."""
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def similarity_to_distance(similarity: float) -> float:
+    """Euclidean distance between unit vectors with the given cosine similarity."""
+    return float(np.sqrt(max(2.0 - 2.0 * similarity, 0.0)))
+
+
+class ANNIndex(ABC):
+    """Top-k cosine similarity search over the rows of a unit-normalized matrix.
+
+    Candidates are always rescored exactly against `embeddings`, so returned scores match brute force.
+    """
+
+    kind: str
+
+    def __init__(self, embeddings: np.ndarray) -> None:
+        self.embeddings = embeddings
+
+    @abstractmethod
+    def candidates(
+        self, query: np.ndarray, k: int, min_similarity: float | None
+    ) -> np.ndarray:
+        """Row indices that may contain the top-k neighbours of a single (unit) query."""
+        pass
+
+    def search(
+        self, queries: np.ndarray, k: int = 1, min_similarity: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get `(indices, scores)` of the top-k neighbours of each query, shape (n_queries, k).
+
+        With `min_similarity`, indexes that support it guarantee that every neighbour at or above it is found.
+        Missing neighbours are reported with index -1 and score -inf.
+        """
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows = self.candidates(query, k, min_similarity)
+            if len(rows) == 0:
+                continue
+            similarity = self.embeddings[rows] @ query
+            top = np.argsort(-similarity, kind="stable")[:k]
+            indices[i, : len(top)] = rows[top]
+            scores[i, : len(top)] = similarity[top]
+        return indices, scores
+
+    @abstractmethod
+    def save(self, path: Path) -> None:
+        pass
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path: Path, embeddings: np.ndarray) -> "ANNIndex":
+        pass
+
+
+class IVFIndex(ANNIndex):
+    """Pure NumPy inverted file index: rows are bucketed by their closest k-means centroid.
+
+    Each bucket keeps its radius (largest member distance to the centroid). A bucket can only hold a row within
+    distance d of the query if `|query - centroid| - radius <= d`, so probing every such bucket makes a
+    `min_similarity` search exact. Without it, the `n_probe` closest buckets are scanned.
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        centroids: np.ndarray,
+        order: np.ndarray,
+        offsets: np.ndarray,
+        radii: np.ndarray,
+        n_probe: int = 8,
+    ) -> None:
+        super().__init__(embeddings)
+        self.centroids = centroids
+        self.order = order  # Row indices grouped by bucket
+        self.offsets = offsets  # Bucket i is order[offsets[i] : offsets[i + 1]]
+        self.radii = radii
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: int | None = None,
+        n_iter: int = 10,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Cluster the embeddings with spherical k-means (about sqrt(n) buckets by default)."""
+
+        n = len(embeddings)
+        n_lists = min(n_lists or max(int(np.sqrt(n)), 1), n)
+        rng = np.random.default_rng(seed)
+        centroids = embeddings[rng.choice(n, size=n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = cls._assign(embeddings, centroids)
+            for i in range(n_lists):
+                members = embeddings[assignments == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        assignments = cls._assign(embeddings, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        distances = np.linalg.norm(embeddings - centroids[assignments], axis=1)
+        radii = np.zeros(n_lists, dtype=np.float32)
+        np.maximum.at(radii, assignments, distances)
+        return cls(embeddings, centroids, order, offsets, radii)
+
+    @staticmethod
+    def _assign(
+        embeddings: np.ndarray, centroids: np.ndarray, batch_size: int = 8192
+    ) -> np.ndarray:
+        return np.concatenate(
+            [
+                np.argmax(embeddings[i : i + batch_size] @ centroids.T, axis=1)
+                for i in range(0, len(embeddings), batch_size)
+            ]
+        )
+
+    def probes(self, queries: np.ndarray, min_similarity: float | None) -> np.ndarray:
+        """Boolean mask of the buckets to scan for each query, shape (n_queries, n_lists)."""
+
+        # |q - c|^2 = |q|^2 + |c|^2 - 2 q.c, for all queries and centroids in one product
+        squared = (
+            np.sum(queries**2, axis=1, keepdims=True)
+            + np.sum(self.centroids**2, axis=1)
+            - 2.0 * queries @ self.centroids.T
+        )
+        distances = np.sqrt(np.maximum(squared, 0.0))
+        if min_similarity is not None:
+            # Small slack for the rounding of the expansion above, scanning an extra bucket is harmless
+            max_distance = similarity_to_distance(min_similarity) + 1e-4
+            return distances - self.radii <= max_distance
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        closest = np.argpartition(distances, n_probe - 1, axis=1)[:, :n_probe]
+        mask = np.zeros(distances.shape, dtype=bool)
+        np.put_along_axis(mask, closest, True, axis=1)
+        return mask
+
+    def candidates(
+        self, query: np.ndarray, k: int, min_similarity: float | None
+    ) -> np.ndarray:
+        buckets = np.flatnonzero(self.probes(query[None, :], min_similarity)[0])
+        return np.concatenate(
+            [self.order[self.offsets[b] : self.offsets[b + 1]] for b in buckets]
+            or [np.empty(0, dtype=np.int64)]
+        )
+
+    def search(
+        self, queries: np.ndarray, k: int = 1, min_similarity: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Batched variant of `ANNIndex.search`: each probed bucket is scored against all its queries at once.
+
+        The running top-k of each query is merged with every bucket it probes, so rows are gathered once per
+        bucket instead of once per query.
+        """
+
+        queries = np.asarray(queries, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if len(queries) == 0:
+            return indices, scores
+
+        probes = self.probes(queries, min_similarity)
+        for b in np.flatnonzero(probes.any(axis=0)):
+            rows = self.order[self.offsets[b] : self.offsets[b + 1]]
+            if len(rows) == 0:
+                continue
+            q = np.flatnonzero(probes[:, b])
+            similarity = queries[q] @ self.embeddings[rows].T
+
+            merged_scores = np.concatenate([scores[q], similarity], axis=1)
+            merged_indices = np.concatenate(
+                [indices[q], np.broadcast_to(rows, similarity.shape)], axis=1
+            )
+            top = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+            scores[q] = np.take_along_axis(merged_scores, top, axis=1)
+            indices[q] = np.take_along_axis(merged_indices, top, axis=1)
+        return indices, scores
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path / "ivf_index.npz",
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            radii=self.radii,
+        )
+
+    @classmethod
+    def load(cls, path: Path, embeddings: np.ndarray) -> "IVFIndex":
+        data = np.load(path / "ivf_index.npz")
+        return cls(
+            embeddings,
+            centroids=data["centroids"],
+            order=data["order"],
+            offsets=data["offsets"],
+            radii=data["radii"],
+        )
+
+
+class HNSWIndex(ANNIndex):
+    """Graph-based index backed by the optional `hnswlib` package.
+
+    Faster than IVF on large lexicons, but approximate: `min_similarity` is not guaranteed, so
+    `ef` should stay well above `k`.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, embeddings: np.ndarray, index, ef: int = 64) -> None:
+        super().__init__(embeddings)
+        self.index = index
+        self.index.set_ef(ef)
+
+    @classmethod
+    def build(
+        cls, embeddings: np.ndarray, M: int = 16, ef_construction: int = 200
+    ) -> "HNSWIndex":
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        index.init_index(
+            max_elements=len(embeddings), M=M, ef_construction=ef_construction
+        )
+        index.add_items(embeddings, np.arange(len(embeddings)))
+        return cls(embeddings, index)
+
+    def candidates(
+        self, query: np.ndarray, k: int, min_similarity: float | None
+    ) -> np.ndarray:
+        labels, _ = self.index.knn_query(query, k=min(max(k, 8), len(self.embeddings)))
+        return labels[0].astype(np.int64)
+
+    def save(self, path: Path) -> None:
+        self.index.save_index(str(path / "hnsw_index.bin"))
+
+    @classmethod
+    def load(cls, path: Path, embeddings: np.ndarray) -> "HNSWIndex":
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        index.load_index(str(path / "hnsw_index.bin"), max_elements=len(embeddings))
+        return cls(embeddings, index)
+
+
+ANN_INDEXES: dict[str, type[ANNIndex]] = {"ivf": IVFIndex, "hnsw": HNSWIndex}
+
+
+def build_ann_index(embeddings: np.ndarray, kind: str = "ivf") -> ANNIndex:
+    """Build an ANN index over unit-normalized embeddings.
+
+    The default pure NumPy IVF index is exact at a similarity threshold. "hnsw" requires `hnswlib`.
+    """
+
+    return ANN_INDEXES[kind].build(embeddings)  # type: ignore
+
+
+def save_ann_index(index: ANNIndex, path: Path) -> None:
+    """Save the index next to the embeddings, with a small metadata file naming its kind."""
+
+    index.save(path)
+    with open(path / INDEX_META_FILE, "w") as f:
+        json.dump({"kind": index.kind, "n": len(index.embeddings)}, f)
+
+
+def load_ann_index(path: Path, embeddings: np.ndarray) -> ANNIndex | None:
+    """Load the index saved in `path`, or None if there is none or it cannot be used."""
+
+    meta_file = path / INDEX_META_FILE
+    if not meta_file.is_file():
+        return None
+
+    with open(meta_file, "r") as f:
+        meta = json.load(f)
+    if meta["n"] != len(embeddings):
+        logging.warning(f"Ignoring stale ANN index in {path}")
+        return None
+    try:
+        return ANN_INDEXES[meta["kind"]].load(path, embeddings)
+    except ImportError:
+        logging.warning(
+            f"Cannot load {meta['kind']} index without its package, ignoring it"
+        )
+        return None
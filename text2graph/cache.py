@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MAX_BYTES = 512 * 1024**2  # 512 MB
+
+
+class CompletionCache:
+    """Content-addressed on-disk cache of raw LLM completions.
+
+    Entries are keyed by a hash of (model, prompt version, temperature, messages) and
+    evicted least-recently-used first once the stored completions exceed `max_bytes`.
+
+    Usage:
+    cache = CompletionCache("app_data/llm_cache.sqlite")
+    key = cache.make_key("gpt-4o", "v3", 0.0, messages)
+    if (raw_output := cache.get(key)) is None:
+        raw_output = ...
+        cache.put(key, raw_output)
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # WAL mode lets API workers and batch jobs share one cache file
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL);"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions (accessed);"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(
+        model: str, prompt_version: str, temperature: float, messages: list[dict]
+    ) -> str:
+        """Hash the request content into a cache key."""
+        payload = json.dumps(
+            [model, prompt_version, temperature, messages],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Get a cached completion and mark it as recently used."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM completions WHERE key = ?;", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE completions SET accessed = ? WHERE key = ?;",
+                (time.time(), key),
+            )
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Store a completion and evict the least recently used entries if over budget."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, accessed) VALUES (?, ?, ?, ?);",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions;")
+        excess = total.fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM completions ORDER BY accessed ASC;"
+        ):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        self.conn.executemany("DELETE FROM completions WHERE key = ?;", evicted)
+        logging.debug(f"Evicted {len(evicted)} completions from {self.path}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM completions;")
+            self.conn.commit()
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            n, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions;"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": n,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+@cache
+def get_completion_cache() -> CompletionCache | None:
+    """Get the process-wide completion cache configured by `LLM_CACHE_SQLITE`, if any."""
+
+    path = os.getenv("LLM_CACHE_SQLITE")
+    if not path:
+        return None
+    max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    return CompletionCache(path, max_bytes=max_bytes)
@@ -0,0 +1,131 @@
+"""On-disk store of known entity embeddings that worker processes can memory-map and share.
+
+Layout of a store directory:
+- known_entity_embeddings.npy: unit-normalized float16 matrix, opened with `mmap_mode="r"`
+- known_entity_names.bin: UTF-8 names concatenated without separators
+- known_entity_name_offsets.npy: int64 offsets, name i is `names.bin[offsets[i] : offsets[i + 1]]`
+"""
+
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from text2graph.ann import normalize
+
+EMBEDDINGS_FILE = "known_entity_embeddings.npy"
+NAMES_FILE = "known_entity_names.bin"
+NAME_OFFSETS_FILE = "known_entity_name_offsets.npy"
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+class NameTable(Sequence[str]):
+    """Read-only list of names backed by a memory-mapped string table, decoded on access."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray) -> None:
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):  # type: ignore
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self.data[self.offsets[i] : self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def is_embedding_store(path: Path) -> bool:
+    return (path / EMBEDDINGS_FILE).is_file() and (path / NAME_OFFSETS_FILE).is_file()
+
+
+def save_embedding_store(
+    path: Path, names: Sequence[str], embeddings: np.ndarray
+) -> None:
+    """Write names and unit-normalized float16 embeddings to a store directory."""
+
+    assert len(names) == len(embeddings)
+
+    encoded = [name.encode("utf-8") for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+
+    with open(path / NAMES_FILE, "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(path / NAME_OFFSETS_FILE, offsets)
+    np.save(path / EMBEDDINGS_FILE, normalize(embeddings).astype(np.float16))
+
+
+def load_embedding_store(path: Path) -> tuple[NameTable, np.ndarray]:
+    """Memory-map the names and embeddings of a store directory, without reading them into memory."""
+
+    offsets = np.load(str(path / NAME_OFFSETS_FILE))
+    if offsets[-1] > 0:
+        data = np.memmap(str(path / NAMES_FILE), dtype=np.uint8, mode="r")
+    else:
+        data = np.zeros(0, dtype=np.uint8)  # Cannot memory-map an empty file
+    embeddings = np.load(str(path / EMBEDDINGS_FILE), mmap_mode="r")
+    return NameTable(data, offsets), embeddings
+
+
+def closest_rows(
+    queries: np.ndarray,
+    embeddings: np.ndarray,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Index and cosine similarity of the closest embedding row to each unit query.
+
+    Scores `chunk_size` rows at a time in float32, so a float16 or memory-mapped matrix is never
+    materialized as a whole.
+    """
+
+    queries = np.asarray(queries, dtype=np.float32)
+    best_idx = np.zeros(len(queries), dtype=np.int64)
+    best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = np.asarray(embeddings[start : start + chunk_size], dtype=np.float32)
+        similarity = queries @ chunk.T
+        idx = np.argmax(similarity, axis=1)
+        scores = similarity[np.arange(len(queries)), idx]
+        better = scores > best_scores
+        best_idx[better] = idx[better] + start
+        best_scores[better] = scores[better]
+    return best_idx, best_scores
+
+
+def top_k_rows(
+    queries: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and cosine similarities of the k closest rows to each unit query, best first, shape (n, k)."""
+
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(embeddings))
+    best_idx = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        chunk = np.asarray(embeddings[start : start + chunk_size], dtype=np.float32)
+        similarity = queries @ chunk.T
+        kc = min(k, similarity.shape[1])
+        idx = np.argpartition(-similarity, kc - 1, axis=1)[:, :kc]
+
+        # Merge with the best rows of previous chunks
+        best_idx = np.concatenate([best_idx, idx + start], axis=1)
+        best_scores = np.concatenate(
+            [best_scores, np.take_along_axis(similarity, idx, axis=1)], axis=1
+        )
+        order = np.argsort(-best_scores, axis=1, kind="stable")[:, :k]
+        best_idx = np.take_along_axis(best_idx, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+    return best_idx, best_scores
@@ -0,0 +1,204 @@
+"""Sentence encoder backends for entity alignment.
+
+All backends run the same SentenceTransformer model (mean pooled token embeddings):
+- "torch": the SentenceTransformer itself, on any device.
+- "onnx": an ONNX export of its transformer, run with `onnxruntime` on CPU without importing torch.
+- "onnx-int8": the same export with dynamically int8-quantized weights.
+
+Usage:
+export_onnx_encoder("all-MiniLM-L6-v2")  # Once, needs torch
+encoder = get_encoder("onnx-int8", "all-MiniLM-L6-v2")
+embeddings = encoder.encode(["Shakopee Formation"], normalize_embeddings=True)
+"""
+
+import json
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+
+ONNX_ENCODER_DIR = Path(__file__).parent / "binaries" / "encoders"
+
+
+class EncoderBackend(Enum):
+    TORCH = "torch"
+    ONNX = "onnx"
+    ONNX_INT8 = "onnx-int8"
+
+
+class Encoder(ABC):
+    """Encode texts into a (n_texts, dim) float32 matrix."""
+
+    @abstractmethod
+    def encode(
+        self, texts: list[str], normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        pass
+
+
+class SentenceTransformerEncoder(Encoder):
+    def __init__(self, model_name: str, device: str = "cpu") -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def encode(
+        self, texts: list[str], normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=normalize_embeddings)
+
+
+class ONNXEncoder(Encoder):
+    """SentenceTransformer exported by `export_onnx_encoder`, run with `onnxruntime` on CPU."""
+
+    def __init__(
+        self, path: Path, quantized: bool = False, batch_size: int = 32
+    ) -> None:
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(path / "config.json", "r") as f:
+            self.config = json.load(f)
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(
+            pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"]
+        )
+
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = onnxruntime.InferenceSession(
+            str(path / model_file), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {x.name for x in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array(
+                [e.attention_mask for e in encodings], dtype=np.int64
+            ),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {k: v for k, v in inputs.items() if k in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over non-padding tokens, as in the SentenceTransformer Pooling module
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.maximum(
+            mask.sum(axis=1), 1e-9
+        )
+
+    def encode(
+        self, texts: list[str], normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.config["dim"]), dtype=np.float32)
+
+        embeddings = np.concatenate(
+            [
+                self._encode_batch(texts[i : i + self.batch_size])
+                for i in range(0, len(texts), self.batch_size)
+            ]
+        ).astype(np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.maximum(norms, 1e-12)
+        return embeddings
+
+
+def default_onnx_path(model_name: str) -> Path:
+    return ONNX_ENCODER_DIR / model_name
+
+
+def export_onnx_encoder(model_name: str, path: str | Path | None = None) -> Path:
+    """Export a mean-pooling SentenceTransformer to ONNX, with an int8-quantized copy."""
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    path = Path(path) if path else default_onnx_path(model_name)
+    path.mkdir(parents=True, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    assert pooling.get_pooling_mode_str() == "mean", "Only mean pooling is supported"
+
+    # Export the transformer; pooling and normalization run in NumPy
+    dummy = transformer.tokenizer(["Shakopee Formation"], return_tensors="pt")
+    input_names = list(dummy.keys())
+    torch.onnx.export(
+        transformer.auto_model,
+        tuple(dummy[name] for name in input_names),
+        str(path / "model.onnx"),
+        input_names=input_names,
+        output_names=["token_embeddings"],
+        dynamic_axes={
+            **{name: {0: "batch", 1: "sequence"} for name in input_names},
+            "token_embeddings": {0: "batch", 1: "sequence"},
+        },
+        opset_version=14,
+    )
+    quantize_dynamic(
+        str(path / "model.onnx"),
+        str(path / "model.int8.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+
+    transformer.tokenizer.backend_tokenizer.save(str(path / "tokenizer.json"))
+    with open(path / "config.json", "w") as f:
+        json.dump(
+            {
+                "model_name": model_name,
+                "max_seq_length": model.max_seq_length,
+                "dim": model.get_sentence_embedding_dimension(),
+                "pad_token": transformer.tokenizer.pad_token,
+                "pad_token_id": transformer.tokenizer.pad_token_id,
+            },
+            f,
+        )
+    return path
+
+
+def create_encoder(
+    backend: EncoderBackend | str, model_name: str, device: str = "cpu"
+) -> Encoder:
+    """Create an encoder of `model_name` running on `backend`.
+
+    ONNX backends run on CPU and need the export from `export_onnx_encoder`.
+    """
+
+    backend = EncoderBackend(backend)
+    if backend == EncoderBackend.TORCH:
+        return SentenceTransformerEncoder(model_name, device=device)
+    return ONNXEncoder(
+        default_onnx_path(model_name), quantized=backend == EncoderBackend.ONNX_INT8
+    )
+
+
+_encoders: dict[tuple[str, str, EncoderBackend], Encoder] = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(
+    backend: EncoderBackend | str, model_name: str, device: str = "cpu"
+) -> Encoder:
+    """Get the process-wide encoder of `model_name` on `backend` and `device`, creating it on first use.
+
+    Handlers of different entity types that use the same model share one copy of its weights.
+    """
+
+    backend = EncoderBackend(backend)
+    if backend != EncoderBackend.TORCH:
+        device = "cpu"  # ONNX backends always run on CPU
+
+    key = (model_name, device, backend)
+    with _encoders_lock:
+        if key not in _encoders:
+            _encoders[key] = create_encoder(backend, model_name, device=device)
+        return _encoders[key]
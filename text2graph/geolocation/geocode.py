@@ -8,6 +8,8 @@ from functools import wraps
 from httpx import AsyncClient
 from dotenv import load_dotenv
 
+from text2graph.utils import LoopBound
+
 
 load_dotenv()
 GEOCODE_API_BASE_URL = "https://geocode.maps.co/search?"
@@ -60,6 +62,22 @@ class RateLimitedClient(AsyncClient):
         return await send
 
 
+# One rate limit for the whole process: geocode.maps.co limits requests per API key, not per search
+_geocode_clients = LoopBound(
+    lambda: RateLimitedClient(interval=1.5, count=1, timeout=30),
+    lambda client: client.aclose(),
+)
+
+
+def get_geocode_client() -> RateLimitedClient:
+    """Get the process-wide rate-limited geocode client of the running event loop."""
+    return _geocode_clients.get()
+
+
+async def close_geocode_client() -> None:
+    await _geocode_clients.aclose()
+
+
 async def get_gps(
     query: str, client: httpx.AsyncClient
 ) -> tuple[float, float, str] | tuple[None, None, str]:
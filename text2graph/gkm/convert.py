@@ -4,6 +4,7 @@ from typing import Protocol
 from pydantic import ValidationError
 from rdflib import Graph, URIRef
 
+from text2graph.macrostrat import MacrostratSnapshotError
 from text2graph.schema import GraphOutput, RelationshipTriplet, Stratigraphy, Mineral
 from text2graph.gkm.namespace import default_rdf_graph
 from text2graph.gkm.features.general import triplet_provenance, spatial_location
@@ -70,6 +71,9 @@ def triplet_to_rdf(triplet: dict | RelationshipTriplet) -> Graph | None:
         try:
             g = feat(g=g, triplet=triplet, object_node=object_node)
 
+        except MacrostratSnapshotError:
+            raise  # A setup error rather than a bad triplet
+
         except Exception as e:
             logging.info(
                 f"failed to add {feat.__name__} to graph with error:{e} for {triplet=}"
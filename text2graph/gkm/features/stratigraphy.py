@@ -1,8 +1,13 @@
 from enum import IntEnum
 from dataclasses import dataclass
+from functools import cache
 from rdflib import Graph, Literal, RDF, RDFS, Namespace, URIRef, BNode
 
-from text2graph.macrostrat import get_all_intervals
+from text2graph.macrostrat import (
+    STRAT_RANK_CONTRACTION,
+    STRAT_RANK_EXPANSION,
+    get_all_intervals,
+)
 from text2graph.schema import Stratigraphy, RelationshipTriplet
 from text2graph.gkm.namespace import GSOC, GSOG, GSGU, GSPR, GST, MSL
 from text2graph.gkm.features.general import (
@@ -34,16 +39,6 @@ class Rank(IntEnum):
     SUPERGROUP = 4
 
 
-STRAT_RANK_EXPANSION = {
-    "Bed": "Bed",
-    "Mbr": "Member",
-    "Fm": "Formation",
-    "Gp": "Group",
-    "SGp": "Supergroup",
-}
-
-STRAT_RANK_CONTRACTION = {v: k for k, v in STRAT_RANK_EXPANSION.items()}
-
 STRAT_RANK_LOOKUP = {
     "Bed": Rank.BED,
     "Mbr": Rank.MEMBER,
@@ -83,7 +78,20 @@ def create_interval_lookup(intervals: list[dict]) -> dict:
     return lookup
 
 
-INTERVAL_LOOKUP = create_interval_lookup(intervals=get_all_intervals())
+@cache
+def get_interval_lookup() -> dict:
+    """
+    interval lookup of all macrostrat intervals, built on first use from the local macrostrat snapshot
+    :return: dictionary key: interval name: value: GST.interval class
+    """
+    return create_interval_lookup(intervals=get_all_intervals())
+
+
+def __getattr__(name: str):
+    # INTERVAL_LOOKUP used to be computed at import time, keep it importable without the import-time cost
+    if name == "INTERVAL_LOOKUP":
+        return get_interval_lookup()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def stratigraphic_type(
@@ -218,7 +226,11 @@ def deposition_age(
                 )
             )
             g.add(
-                (bnode_deposition, GSOC.occupiesTimeDirectly, INTERVAL_LOOKUP[period])
+                (
+                    bnode_deposition,
+                    GSOC.occupiesTimeDirectly,
+                    get_interval_lookup()[period],
+                )
             )
             g.add((object_node, GSOC.isParticipantIn, bnode_deposition))
             g = add_macrostrat_query_and_entity(
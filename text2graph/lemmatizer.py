@@ -1,3 +1,4 @@
+import asyncio
 from typing import Protocol
 from enum import Enum
 
@@ -5,7 +6,8 @@ import nltk
 import spacy
 from nltk.stem import WordNetLemmatizer
 
-from .llm import ask_llm
+from .llm import OpenSourceModel, query_llm
+from .providers import get_provider_registry
 
 
 class Implementation(Enum):
@@ -44,10 +46,22 @@ class LLM:
             "role": "system",
             "content": "You are a geology expert and you are very good in simplifying location and address. You will simplify the provided location and address and provide their base form.",
         }
+        # One loop for all words, so that the pooled provider connections are reused
+        self.loop = asyncio.new_event_loop()
 
-    def lemmatize(self, word: str) -> str:
+    async def alemmatize(self, word: str) -> str:
         user_message = {"role": "user", "content": word}
-        return ask_llm(messages=[self.system_prompt, user_message], model="mixtral")
+        return await query_llm(
+            OpenSourceModel.MIXTRAL, messages=[self.system_prompt, user_message]
+        )
+
+    def lemmatize(self, word: str) -> str:
+        return self.loop.run_until_complete(self.alemmatize(word))
+
+    def close(self) -> None:
+        """Close the provider connections and the event loop."""
+        self.loop.run_until_complete(get_provider_registry().aclose())
+        self.loop.close()
 
 
 class Embedding:
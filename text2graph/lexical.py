@@ -0,0 +1,70 @@
+"""Lexical matching of entity names: canonical forms and a character-trigram index."""
+
+import re
+import unicodedata
+from collections import defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+
+from text2graph.macrostrat import STRAT_RANK_CONTRACTION
+
+RANK_ABBREVIATIONS = {
+    **{k.lower(): v.lower() for k, v in STRAT_RANK_CONTRACTION.items()},
+    **{v.lower(): v.lower() for v in STRAT_RANK_CONTRACTION.values()},
+}
+
+
+def canonical_name(name: str) -> str:
+    """Canonical form of an entity name for exact lookups.
+
+    Case, punctuation and whitespace are ignored and ranks are contracted, e.g. "Shakopee  Formation." and
+    "shakopee fm" are both "shakopee fm".
+    """
+
+    name = unicodedata.normalize("NFKC", name).lower()
+    tokens = re.sub(r"[^\w\s-]", " ", name).split()
+    return " ".join(RANK_ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def trigrams(name: str) -> set[str]:
+    """Character trigrams of the canonical name, padded so that word starts and ends count."""
+
+    padded = f"  {canonical_name(name)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to names, ranking names by trigram Jaccard similarity.
+
+    Robust to spelling variants and OCR damage (e.g. "Shak0pee Fm" still shares most trigrams with "Shakopee Fm").
+
+    Usage:
+    index = TrigramIndex(["Shakopee", "St. Peter Sandstone"])
+    index.search("St Petr Sandstone", k=5)  # [(1, 0.63...), ...]
+    """
+
+    def __init__(self, names: Sequence[str]) -> None:
+        postings: dict[str, list[int]] = defaultdict(list)
+        self.n_trigrams = np.zeros(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            grams = trigrams(name)
+            self.n_trigrams[i] = len(grams)
+            for gram in grams:
+                postings[gram].append(i)
+        self.postings = {
+            gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()
+        }
+
+    def search(self, name: str, k: int = 32) -> list[tuple[int, float]]:
+        """Indices and Jaccard similarities of the (up to) k most similar names."""
+
+        grams = trigrams(name)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return []
+
+        ids, overlap = np.unique(np.concatenate(hits), return_counts=True)
+        scores = overlap / (len(grams) + self.n_trigrams[ids] - overlap)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(ids[i]), float(scores[i])) for i in top]
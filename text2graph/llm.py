@@ -1,36 +1,42 @@
+import asyncio
 import json
 import logging
 import os
 import sqlite3
+from collections.abc import AsyncIterator
 from enum import Enum
 from functools import partial
 
-import requests
-from anthropic import Anthropic
 from dotenv import load_dotenv
-from openai import OpenAI
 from pydantic import ValidationError
-from requests.auth import HTTPBasicAuth
 
 from text2graph.alignment import (
     AlignmentHandler,
 )
+from text2graph.alignment_service import get_alignment_service
 from text2graph.askxdd import Retriever
-from text2graph.geolocation.geocode import RateLimitedClient
+from text2graph.cache import get_completion_cache
+from text2graph.geolocation.geocode import RateLimitedClient, get_geocode_client
 from text2graph.gkm.convert import to_ttl
 from text2graph.macrostrat import EntityType
-from text2graph.prompt import PromptHandler, get_prompt_handler
+from text2graph.prompt import PromptHandler, PromptLayout, get_prompt_handler
+from text2graph.providers import Provider, get_provider
 from text2graph.schema import (
     GraphOutput,
     Location,
     Mineral,
+    Paragraph,
     Provenance,
     RelationshipTriplet,
     Stratigraphy,
 )
+from text2graph.utils import SingleFlight, is_json
 
 load_dotenv()
 
+# Deduplicate concurrent extractions of the same paragraph across requests
+EXTRACTION_FLIGHTS = SingleFlight()
+
 
 class OpenSourceModel(Enum):
     """Supported open-source language models via Ollama."""
@@ -64,111 +70,109 @@ def to_model(model: str) -> OpenSourceModel | OpenAIModel | AnthropicModel:
         raise ValueError(f"Model '{model}' is not supported.")
 
 
-def query_openai(
+async def query_openai(
     model: OpenAIModel, messages: list[dict[str, str]], temperature: float = 0.0
 ) -> str:
     """Query OpenAI API for language model completion."""
-    client = OpenAI()
-    completion = client.chat.completions.create(
-        model=model.value,
-        response_format={"type": "json_object"},
-        messages=messages,  # type: ignore
-        temperature=temperature,
-        stream=False,
-    )  # type: ignore
-    return completion.choices[0].message.content
-
-
-def query_local_ollama(
+    return await get_provider("openai").complete(model.value, messages, temperature)
+
+
+async def query_local_ollama(
     model: OpenSourceModel, messages: list[dict], temperature: float = 0.0
 ) -> str:
     """Query self-hosted OLLAMA for language model completion."""
-    url = os.getenv("OLLAMA_URL")
-    if not url:
-        raise ValueError("OLLAMA_URL is not set.")
-    user = os.getenv("OLLAMA_USER", "")
-    password = os.getenv("OLLAMA_PASSWORD", "")
-    data = {
-        "model": model.value,
-        "messages": messages,
-        "temperature": temperature,
-        "stream": False,
-        "format": "json",
-    }
-    # Non-streaming mode
-    response = requests.post(url, auth=HTTPBasicAuth(user, password), json=data)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
+    return await get_provider("ollama").complete(model.value, messages, temperature)
 
 
-def query_llm_queue(
+async def query_ollama_router(
     model: OpenSourceModel, messages: list[dict], temperature: float = 0.0
 ) -> str:
-    """Query CHTC Ollama proxy."""
-
-    CHTC_LLM_API_URL = (
-        f"http://{os.getenv('CHTC_LLM_HOST')}:{os.getenv('CHTC_LLM_PORT')}"
-    )
-    auth_headers = {"Api-Key": os.getenv("CHTC_LLM_API_KEY")}
-
-    # This is vanilla Ollama API style
-    data = {
-        "model": model.value,
-        "messages": messages,
-        "temperature": temperature,
-        "stream": False,
-        "format": "json",
-    }
-    # Non-streaming mode
-    response = requests.post(
-        f"{CHTC_LLM_API_URL}/api/chat", headers=auth_headers, json=data
-    )
-    response.raise_for_status()
-    return (
-        json.loads(response.json()["_content"])["message"]["content"]
-        .strip()
-        .replace("\\", "")
+    """Query the least loaded healthy endpoint in `OLLAMA_URLS`."""
+    return await get_provider("ollama_router").complete(
+        model.value, messages, temperature
     )
 
 
-def query_anthropic(
+async def query_llm_queue(
+    model: OpenSourceModel, messages: list[dict], temperature: float = 0.0
+) -> str:
+    """Query CHTC Ollama proxy."""
+    return await get_provider("llm_queue").complete(model.value, messages, temperature)
+
+
+async def query_anthropic(
     model: AnthropicModel, messages: list[dict], temperature: float = 0.0
 ) -> str:
     """Query Anthropic for language model completion."""
+    return await get_provider("anthropic").complete(model.value, messages, temperature)
 
-    client = Anthropic()
 
-    # Extract system message
-    for message in messages:
-        if message["role"] == "system":
-            system_message = message["content"]
-            messages.remove(message)
-        else:
-            system_message = None
-
-    # Format user message
-    user_messages = []
-    for message in messages:
-        if message["role"] == "user":
-            user_messages.append(
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": message["content"]}],
-                }
-            )
+def get_model_provider(
+    model: OpenSourceModel | OpenAIModel | AnthropicModel,
+) -> Provider:
+    """Get the provider serving `model`."""
 
-    kwargs = {
-        "model": model.value,
-        "max_tokens": 4096,
-        "messages": user_messages,
-        "temperature": temperature,
-        "stream": False,
-    }
-    if system_message:
-        kwargs["system"] = system_message
+    if isinstance(model, OpenSourceModel):
+        if os.getenv("OLLAMA_URLS"):
+            return get_provider("ollama_router")
+        if int(os.getenv("USE_LLM_QUEUE", 0)):
+            return get_provider("llm_queue")
+        return get_provider("ollama")
+
+    if isinstance(model, OpenAIModel):
+        return get_provider("openai")
+
+    if isinstance(model, AnthropicModel):
+        return get_provider("anthropic")
+
+    raise ValueError(f"Model '{model}' is not supported.")
+
+
+async def query_llm(
+    model: OpenSourceModel | OpenAIModel | AnthropicModel,
+    messages: list[dict],
+    temperature: float = 0.0,
+    stream: bool = True,
+) -> str:
+    """Route a completion request to the provider serving `model`.
+
+    With `stream`, generation is cancelled as soon as the top-level json object closes.
+    """
+    provider = get_model_provider(model)
+    if stream:
+        return await provider.complete_json(model.value, messages, temperature)
+    return await provider.complete(model.value, messages, temperature)
+
+
+async def cached_query_llm(
+    model: OpenSourceModel | OpenAIModel | AnthropicModel,
+    messages: list[dict],
+    temperature: float,
+    prompt_version: str,
+    use_cache: bool = True,
+    stream: bool = True,
+) -> str:
+    """Query the LLM through the `LLM_CACHE_SQLITE` completion cache, if configured.
+
+    Only outputs that parse as json are cached, so a malformed completion is retried on the next request.
+    """
 
-    response = client.messages.create(**kwargs)
-    return response.content[0].text
+    completion_cache = get_completion_cache() if use_cache else None
+    if completion_cache is None:
+        return await query_llm(model, messages, temperature, stream=stream)
+
+    cache_key = completion_cache.make_key(
+        model.value, prompt_version, temperature, messages
+    )
+    # sqlite calls block, keep them off the event loop
+    raw_output = await asyncio.to_thread(completion_cache.get, cache_key)
+    if raw_output is None:
+        raw_output = await query_llm(model, messages, temperature, stream=stream)
+        if is_json(raw_output):
+            await asyncio.to_thread(completion_cache.put, cache_key, raw_output)
+        else:
+            logging.info("Not caching an LLM output that is not valid json")
+    return raw_output
 
 
 def to_triplet(
@@ -196,6 +200,45 @@ def to_triplet(
     )
 
 
+def align_graphs(
+    graphs: list[GraphOutput],
+    alignment_handler: AlignmentHandler,
+    threshold: float = 0.95,
+) -> None:
+    """Align triplet objects of all graphs to their closest known entities in one batch, in place."""
+
+    # Only apply to objects (strat_name or mineral) because location is not in Macrostrat
+    triplets = [triplet for graph in graphs for triplet in graph.triplets]
+    names = [triplet.object.name for triplet in triplets]
+    closests = alignment_handler.get_closest_known_entities(names, threshold=threshold)
+    _swap_objects(triplets, closests)
+
+
+async def align_graphs_batched(
+    graphs: list[GraphOutput],
+    alignment_handler: AlignmentHandler,
+    threshold: float = 0.95,
+) -> None:
+    """Same as `align_graphs`, but batched with concurrent requests on the handler's alignment service.
+
+    The encoder runs on a worker thread, so the event loop is not blocked.
+    """
+
+    triplets = [triplet for graph in graphs for triplet in graph.triplets]
+    names = [triplet.object.name for triplet in triplets]
+    service = get_alignment_service(alignment_handler)
+    closests = await service.get_closest_known_entities(names, threshold=threshold)
+    _swap_objects(triplets, closests)
+
+
+def _swap_objects(triplets: list[RelationshipTriplet], closests: list[str]) -> None:
+    for triplet, closest in zip(triplets, closests):
+        # Update triplet object if closest known entity is different from original
+        if closest != triplet.object.name:
+            logging.info(f"Swapping {triplet.object.name} with {closest}")
+            triplet.object = type(triplet.object)(name=closest)
+
+
 async def post_process(
     raw_llm_output: str,
     prompt_handler: PromptHandler,
@@ -203,8 +246,13 @@ async def post_process(
     threshold: float = 0.95,
     hydrate: bool = True,
     provenance: Provenance | None = None,
+    client: RateLimitedClient | None = None,
 ) -> GraphOutput:
-    """Post-process raw output to GraphOutput model."""
+    """Post-process raw output to GraphOutput model.
+
+    Locations are hydrated through `client`, by default the process-wide geocode client, so that concurrent
+    paragraphs share one rate limit.
+    """
     triplets = json.loads(raw_llm_output)
 
     # Handle different response formats form different LLMs
@@ -231,25 +279,105 @@ async def post_process(
         logging.info(f"unexpected triplet format: {triplets}")
         raise ValueError("Unexpected triplet format")
 
+    output = GraphOutput(triplets=safe_triplets)
     if alignment_handler:
-        for triplet in safe_triplets:
-            # Only apply to strat_name because location is not in Macrostrat
-            name = triplet.object.name
-            closest = alignment_handler.get_closest_known_entity(
-                name, threshold=threshold
-            )
+        await align_graphs_batched([output], alignment_handler, threshold=threshold)
+    if hydrate:
+        await output.hydrate(client=client or get_geocode_client())
+    return output
 
-            # Update triplet object if closest known entity is different from original
-            if closest != name:
-                logging.info("Swapping", name, "with", closest)
-                triplet.object = Stratigraphy(name=closest)
 
-    output = GraphOutput(triplets=safe_triplets)
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for packing decisions."""
+    return len(text) // 4 + 1
+
+
+def pack_paragraphs(texts: list[str], token_budget: int) -> list[list[int]]:
+    """Greedily group consecutive texts (by index) into packs within `token_budget` tokens.
+
+    A text larger than the budget gets a pack of its own.
+    """
+
+    packs: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n_tokens = estimate_tokens(text)
+        if current and current_tokens + n_tokens > token_budget:
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def split_packed_output(
+    raw_llm_output: str, paragraph_ids: list[str]
+) -> dict[str, str]:
+    """Split a packed LLM output into one raw triplets json per paragraph id.
+
+    Raises `json.JSONDecodeError` or `ValueError` if the output is not a list of triplets.
+    """
+
+    output = json.loads(raw_llm_output)
+    triplets = output.get("triplets", []) if isinstance(output, dict) else output
+    if not isinstance(triplets, list):
+        raise ValueError(f"Expected a list of triplets, got: {triplets}")
+
+    grouped: dict[str, list[dict]] = {id: [] for id in paragraph_ids}
+    for triplet in triplets:
+        if not isinstance(triplet, dict):
+            logging.warning(f"Dropping malformed triplet: {triplet}")
+            continue
+        id = str(triplet.pop("paragraph_id", "")).strip("[] ")
+        if id not in grouped and len(paragraph_ids) == 1:
+            id = paragraph_ids[0]
+        if id not in grouped:
+            logging.warning(f"Dropping triplet with unknown paragraph_id: {triplet}")
+            continue
+        grouped[id].append(triplet)
+
+    return {
+        id: json.dumps({"triplets": group}, ensure_ascii=False)
+        for id, group in grouped.items()
+    }
+
+
+async def post_process_packed(
+    raw_llm_output: str,
+    paragraph_ids: list[str],
+    prompt_handler: PromptHandler,
+    alignment_handler: AlignmentHandler | None = None,
+    threshold: float = 0.95,
+    hydrate: bool = True,
+    provenances: dict[str, Provenance] | None = None,
+    client: RateLimitedClient | None = None,
+) -> dict[str, GraphOutput]:
+    """Post-process a packed raw output to one GraphOutput per paragraph id."""
+
+    raw_outputs = split_packed_output(raw_llm_output, paragraph_ids)
+    provenances = provenances or {}
+    graphs = await asyncio.gather(
+        *[
+            post_process(
+                raw_llm_output=raw_outputs[id],
+                prompt_handler=prompt_handler,
+                hydrate=False,
+                provenance=provenances.get(id),
+            )
+            for id in paragraph_ids
+        ]
+    )
+
+    # Align the whole pack in one batch before hydrating the aligned names
+    if alignment_handler:
+        await align_graphs_batched(graphs, alignment_handler, threshold=threshold)
     if hydrate:
-        await output.hydrate(
-            client=RateLimitedClient(interval=1.5, count=1, timeout=30)
-        )
-    return output
+        client = client or get_geocode_client()
+        await asyncio.gather(*[graph.hydrate(client=client) for graph in graphs])
+    return dict(zip(paragraph_ids, graphs))
 
 
 async def ask_llm(
@@ -262,9 +390,16 @@ async def ask_llm(
     doc_ids: list[str] | None = None,
     hydrate: bool = True,
     provenance: Provenance | None = None,
+    use_cache: bool = True,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+    stream: bool = True,
 ) -> str | GraphOutput:
     """Ask model with a data package.
 
+    Completions are served from the `LLM_CACHE_SQLITE` completion cache when it is configured and `use_cache` is set.
+    Use `PromptLayout.PREFIX_CACHE` to share a static prompt prefix across requests for KV/prompt caching.
+    With `stream`, the provider stops generating once the top-level json object is complete.
+
     Example input: [{"role": "user", "content": "Hello world example in python."}]
     """
     if not doc_ids:
@@ -278,21 +413,16 @@ async def ask_llm(
     if isinstance(prompt_handler, str):
         prompt_handler = get_prompt_handler(prompt_handler)
 
-    messages = prompt_handler.get_gpt_messages(text)
+    messages = prompt_handler.get_gpt_messages(text, layout=PromptLayout(prompt_layout))
 
-    use_chtc = int(os.getenv("USE_LLM_QUEUE", 0))
-
-    if isinstance(model, OpenSourceModel):
-        if use_chtc:
-            raw_output = query_llm_queue(model, messages, temperature)
-        else:
-            raw_output = query_local_ollama(model, messages, temperature)
-
-    if isinstance(model, OpenAIModel):
-        raw_output = query_openai(model, messages, temperature)
-
-    if isinstance(model, AnthropicModel):
-        raw_output = query_anthropic(model, messages, temperature)
+    raw_output = await cached_query_llm(
+        model,
+        messages,
+        temperature,
+        prompt_handler.version,
+        use_cache=use_cache,
+        stream=stream,
+    )
 
     logging.debug(f"Raw llm output: {raw_output}")
 
@@ -320,7 +450,99 @@ async def ask_llm(
     )
 
 
-async def llm_graph_from_search(
+async def ask_llm_packed(
+    texts: dict[str, str],
+    prompt_handler: PromptHandler | str = "stratname_v3",
+    alignment_handler: AlignmentHandler | None = None,
+    model: OpenSourceModel | OpenAIModel | AnthropicModel | str = "gpt-3.5-turbo",
+    temperature: float = 0.0,
+    doc_ids: dict[str, list[str]] | None = None,
+    hydrate: bool = True,
+    provenances: dict[str, Provenance] | None = None,
+    use_cache: bool = True,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+    stream: bool = True,
+) -> dict[str, GraphOutput]:
+    """Ask model for several paragraphs (keyed by paragraph id) in one request.
+
+    The paragraphs share one system prompt, the returned triplets are split back per paragraph id.
+    """
+    doc_ids = doc_ids or {}
+    provenances = provenances or {}
+
+    if isinstance(model, str):
+        model = to_model(model)
+
+    if isinstance(prompt_handler, str):
+        prompt_handler = get_prompt_handler(prompt_handler)
+
+    messages = prompt_handler.get_packed_gpt_messages(
+        texts, layout=PromptLayout(prompt_layout)
+    )
+    raw_output = await cached_query_llm(
+        model,
+        messages,
+        temperature,
+        prompt_handler.version,
+        use_cache=use_cache,
+        stream=stream,
+    )
+    logging.debug(f"Raw packed llm output: {raw_output}")
+
+    ask_llm_provenances = {
+        id: Provenance(
+            source_name=model.__class__.__name__,
+            source_version=model.value,
+            additional_values=dict(
+                temperature=temperature,
+                prompt=prompt_handler.version,
+                doc_ids=doc_ids.get(id, []),
+                packed_with=[other for other in texts if other != id],
+            ),
+            previous=provenances.get(id),
+        )
+        for id in texts
+    }
+
+    return await post_process_packed(
+        raw_llm_output=raw_output,
+        paragraph_ids=list(texts),
+        prompt_handler=prompt_handler,
+        alignment_handler=alignment_handler,
+        hydrate=hydrate,
+        provenances=ask_llm_provenances,
+    )
+
+
+def extraction_key(
+    hashed_text: str,
+    model: OpenSourceModel | OpenAIModel | AnthropicModel | str,
+    prompt_handler: PromptHandler,
+    alignment_handler: AlignmentHandler | None,
+    hydrate: bool,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+) -> tuple:
+    """Key identifying one paragraph going through one extraction pipeline."""
+
+    if not isinstance(model, str):
+        model = model.value
+    alignment = (
+        (alignment_handler.entity_type.value, alignment_handler.version)
+        if alignment_handler
+        else None
+    )
+    return (
+        hashed_text,
+        model,
+        prompt_handler.name,
+        prompt_handler.version,
+        alignment,
+        hydrate,
+        PromptLayout(prompt_layout).value,
+    )
+
+
+async def iter_llm_graph_from_search(
     query: str,
     top_k: int,
     model: str,
@@ -328,42 +550,148 @@ async def llm_graph_from_search(
     prompt_handler: PromptHandler,
     hydrate: bool = False,
     ttl: bool = True,
-) -> list[str] | list[GraphOutput]:
-    """Business logic layer for llm graph extraction from search."""
+    max_concurrency: int | None = None,
+    pack_token_budget: int | None = None,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+) -> AsyncIterator[tuple[int, str | GraphOutput]]:
+    """Yield `(retrieval rank, graph)` for each paragraph of the search as soon as it is extracted.
+
+    Paragraphs are extracted concurrently within the provider's limit, which is shared by all concurrent searches, so results arrive in completion order.
+    `max_concurrency` further limits the requests in flight for this search.
+    With `pack_token_budget`, consecutive paragraphs are packed into one LLM request of up to that many estimated tokens.
+    """
 
     r = Retriever()
     paragraphs = r.query(query, top_k=top_k)
-    graphs = []
-    for paragraph in paragraphs:
-        graph = await ask_llm(
-            text=paragraph.text_content,
-            prompt_handler=prompt_handler,
-            alignment_handler=alignment_handler,
-            model=model,
-            temperature=0.0,
-            to_triplets=True,
-            doc_ids=[
-                paragraph.paper_id
-            ],  # TODO: Confirm with Iain if this is the correct usage. It's unclear why a paragraph from one document requires a list.
-            provenance=paragraph.provenance,
-            hydrate=hydrate,
-        )
 
-        # Add paragraph level information
-        assert isinstance(graph, GraphOutput)
+    provider = get_model_provider(to_model(model))
+    semaphore = asyncio.Semaphore(max_concurrency or provider.max_concurrency)
+
+    def with_paragraph_info(graph: GraphOutput, paragraph: Paragraph) -> GraphOutput:
+        """Add paragraph level information, on a copy since coalesced callers share the graph."""
+        graph = graph.model_copy(deep=True)
         graph.id = paragraph.id
         graph.paper_id = paragraph.paper_id
         graph.hashed_text = paragraph.hashed_text
         graph.text_content = paragraph.text_content
+        return graph
+
+    async def extract(paragraph: Paragraph) -> str | GraphOutput:
+        async with semaphore, provider.semaphore:
+            return await ask_llm(
+                text=paragraph.text_content,
+                prompt_handler=prompt_handler,
+                alignment_handler=alignment_handler,
+                model=model,
+                temperature=0.0,
+                to_triplets=True,
+                doc_ids=[
+                    paragraph.paper_id
+                ],  # TODO: Confirm with Iain if this is the correct usage. It's unclear why a paragraph from one document requires a list.
+                provenance=paragraph.provenance,
+                hydrate=hydrate,
+                prompt_layout=prompt_layout,
+            )
 
-        graphs.append(graph)
+    async def extract_pack(pack: list[Paragraph]) -> dict[str, GraphOutput]:
+        async with semaphore, provider.semaphore:
+            return await ask_llm_packed(
+                texts={paragraph.id: paragraph.text_content for paragraph in pack},
+                prompt_handler=prompt_handler,
+                alignment_handler=alignment_handler,
+                model=model,
+                temperature=0.0,
+                doc_ids={paragraph.id: [paragraph.paper_id] for paragraph in pack},
+                provenances={paragraph.id: paragraph.provenance for paragraph in pack},
+                hydrate=hydrate,
+                prompt_layout=prompt_layout,
+            )
+
+    async def paragraph_to_graph(i: int) -> list[tuple[int, GraphOutput]]:
+        paragraph = paragraphs[i]
+        key = extraction_key(
+            paragraph.hashed_text,
+            model,
+            prompt_handler,
+            alignment_handler,
+            hydrate,
+            prompt_layout,
+        )
+        graph = await EXTRACTION_FLIGHTS.do(key, lambda: extract(paragraph))
+        assert isinstance(graph, GraphOutput)
+        return [(i, with_paragraph_info(graph, paragraph))]
+
+    async def pack_to_graphs(pack: list[int]) -> list[tuple[int, GraphOutput]]:
+        packed_hashed_text = "packed:" + "|".join(
+            paragraphs[i].hashed_text for i in pack
+        )
+        key = extraction_key(
+            packed_hashed_text,
+            model,
+            prompt_handler,
+            alignment_handler,
+            hydrate,
+            prompt_layout,
+        )
+        graphs = await EXTRACTION_FLIGHTS.do(
+            key, lambda: extract_pack([paragraphs[i] for i in pack])
+        )
+        return [
+            (i, with_paragraph_info(graphs[paragraphs[i].id], paragraphs[i]))
+            for i in pack
+        ]
 
     logging.info(paragraphs)
 
-    if not ttl:
-        return graphs
+    if pack_token_budget:
+        packs = pack_paragraphs([p.text_content for p in paragraphs], pack_token_budget)
+        tasks = [asyncio.ensure_future(pack_to_graphs(pack)) for pack in packs]
+    else:
+        tasks = [
+            asyncio.ensure_future(paragraph_to_graph(i)) for i in range(len(paragraphs))
+        ]
+
+    try:
+        for group in asyncio.as_completed(tasks):
+            for i, graph in await group:
+                yield i, to_ttl(graph) if ttl else graph
+    finally:
+        # The consumer stopped early (e.g. a streaming client disconnected)
+        for task in tasks:
+            task.cancel()
 
-    return [to_ttl(graph) for graph in graphs]
+
+async def llm_graph_from_search(
+    query: str,
+    top_k: int,
+    model: str,
+    alignment_handler: AlignmentHandler,
+    prompt_handler: PromptHandler,
+    hydrate: bool = False,
+    ttl: bool = True,
+    max_concurrency: int | None = None,
+    pack_token_budget: int | None = None,
+    prompt_layout: PromptLayout = PromptLayout.DEFAULT,
+) -> list[str] | list[GraphOutput]:
+    """Business logic layer for llm graph extraction from search.
+
+    Same as `iter_llm_graph_from_search`, but waits for all paragraphs and returns them in retrieval order.
+    """
+
+    outputs = iter_llm_graph_from_search(
+        query=query,
+        top_k=top_k,
+        model=model,
+        alignment_handler=alignment_handler,
+        prompt_handler=prompt_handler,
+        hydrate=hydrate,
+        ttl=ttl,
+        max_concurrency=max_concurrency,
+        pack_token_budget=pack_token_budget,
+        prompt_layout=prompt_layout,
+    )
+    ranked = sorted([output async for output in outputs], key=lambda x: x[0])
+    return [output for _, output in ranked]
 
 
 def get_graph_from_cache(
@@ -407,23 +735,32 @@ def get_graph_from_cache(
     return graphs
 
 
-async def fast_llm_graph_from_search(
+async def iter_fast_llm_graph_from_search(
     query: str,
     top_k: int,
     ttl: bool = True,
     hydrate: bool = False,
     with_text: bool = False,
-) -> list[str] | list[GraphOutput]:
-    """Business logic layer for llm graph extraction from search using locally cached."""
+) -> AsyncIterator[tuple[int, str | GraphOutput]]:
+    """Yield `(index, graph)` for each locally cached graph of the search as soon as it is hydrated.
+
+    `index` is the retrieval rank of the graph's paragraph, paragraphs missing from the cache are skipped.
+    """
 
     r = Retriever()
     paragraphs = r.query(query, top_k=top_k)
     id2text = {paragraph.id: paragraph.text_content for paragraph in paragraphs}
+    id2rank = {paragraph.id: i for i, paragraph in enumerate(paragraphs)}
 
+    # The cache returns rows in storage order, stream them in retrieval order
     graphs = get_graph_from_cache([paragraph.id for paragraph in paragraphs])
+    ranked = sorted(
+        [(id2rank[graph.id], graph) for graph in graphs if graph.id in id2rank],
+        key=lambda x: x[0],
+    )
 
-    gps_client = RateLimitedClient(interval=1.2)
-    for graph in graphs:
+    gps_client = get_geocode_client()
+    for i, graph in ranked:
         # Get text
         if with_text and graph.id:
             try:
@@ -434,8 +771,19 @@ async def fast_llm_graph_from_search(
         if hydrate:
             await graph.hydrate(client=gps_client)
 
-    if not ttl:
-        return graphs
+        yield i, to_ttl(graph) if ttl else graph
+
 
-    # TTL returns
-    return [to_ttl(graph) for graph in graphs]
+async def fast_llm_graph_from_search(
+    query: str,
+    top_k: int,
+    ttl: bool = True,
+    hydrate: bool = False,
+    with_text: bool = False,
+) -> list[str] | list[GraphOutput]:
+    """Business logic layer for llm graph extraction from search using locally cached."""
+
+    outputs = iter_fast_llm_graph_from_search(
+        query=query, top_k=top_k, ttl=ttl, hydrate=hydrate, with_text=with_text
+    )
+    return [output async for _, output in outputs]
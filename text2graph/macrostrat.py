@@ -1,16 +1,45 @@
+import asyncio
+import gzip
+import importlib.util
+import json
 import logging
+import os
 import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
 from enum import Enum
-from functools import cache
+from functools import cache, lru_cache
+from pathlib import Path
 from urllib.parse import quote
 
 import httpx
 import requests
+from dotenv import load_dotenv
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
-from text2graph.utils import log_time
+from text2graph.utils import LoopBound, atomic_path, log_time
+
+load_dotenv()
 
 BASE_URL = "https://macrostrat.org/api"
 
+# Full `/defs` tables are read from gzipped JSON snapshots, see `get_table`
+DEFAULT_SNAPSHOT_DIR = Path(__file__).parent / "binaries" / "macrostrat"
+SNAPSHOT_TABLES = ["strat_names", "minerals", "lithologies", "intervals"]
+SNAPSHOT_TIMEOUT = 60
+MIRROR_FILE = "macrostrat.sqlite"
+
+# Shared API client, see `MacrostratClient`
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+
 ROUTES_DOCS = {
     "/defs/autocomplete": "Quickly retrieve all definitions matching a query. Limited to 100 results.",
     "/defs/define": "Define multiple terms simultaneously",
@@ -45,14 +74,142 @@ class EntityType(Enum):
     LITHOLOGY = "lithology"
 
 
+# Mirrored table, name key and id key of each entity type
+MIRROR_TABLES = {
+    EntityType.STRAT_NAME: ("strat_names", "strat_name", "strat_name_id"),
+    EntityType.MINERAL: ("minerals", "mineral", "mineral_id"),
+    EntityType.LITHOLOGY: ("lithologies", "name", "lith_id"),
+}
+
+
+STRAT_RANK_EXPANSION = {
+    "Bed": "Bed",
+    "Mbr": "Member",
+    "Fm": "Formation",
+    "Gp": "Group",
+    "SGp": "Supergroup",
+}
+
+STRAT_RANK_CONTRACTION = {v: k for k, v in STRAT_RANK_EXPANSION.items()}
+
+
+class MacrostratSnapshotError(RuntimeError):
+    """Macrostrat data is needed but neither a local snapshot nor the network may provide it."""
+
+
+def is_offline() -> bool:
+    """Whether MACROSTRAT_OFFLINE forbids network access, so that missing snapshots fail fast."""
+    return os.getenv("MACROSTRAT_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def snapshot_dir() -> Path:
+    return Path(os.getenv("MACROSTRAT_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR))
+
+
+def load_snapshot(table: str, path: Path | None = None) -> dict | None:
+    """Load the snapshot of a `/defs` table, or None if there is none."""
+
+    file = (path or snapshot_dir()) / f"{table}.json.gz"
+    if not file.is_file():
+        return None
+    with gzip.open(file, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_snapshot(table: str, snapshot: dict, path: Path | None = None) -> None:
+    """Write the snapshot of a `/defs` table atomically."""
+
+    path = path or snapshot_dir()
+    path.mkdir(parents=True, exist_ok=True)
+    with atomic_path(path / f"{table}.json.gz") as tmp_file:
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+
+
+def fetch_table(
+    table: str, snapshot: dict | None = None, base_url: str = BASE_URL
+) -> dict | None:
+    """Download a full `/defs` table, or None if it has not changed since `snapshot` (conditional request)."""
+
+    if is_offline():
+        raise MacrostratSnapshotError(
+            f"Cannot fetch Macrostrat {table}: MACROSTRAT_OFFLINE is set"
+        )
+
+    headers = {}
+    if snapshot and snapshot.get("etag"):
+        headers["If-None-Match"] = snapshot["etag"]
+    if snapshot and snapshot.get("last_modified"):
+        headers["If-Modified-Since"] = snapshot["last_modified"]
+
+    r = requests.get(
+        f"{base_url}/defs/{table}?all", headers=headers, timeout=SNAPSHOT_TIMEOUT
+    )
+    if r.status_code == 304:
+        return None
+    r.raise_for_status()
+    success = r.json()["success"]
+    return {
+        "table": table,
+        "v": success["v"],
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "data": success["data"],
+    }
+
+
+def refresh_snapshot(
+    table: str, path: Path | None = None, base_url: str = BASE_URL
+) -> bool:
+    """Refresh the snapshot of a `/defs` table, returning whether it changed."""
+
+    snapshot = load_snapshot(table, path)
+    fetched = fetch_table(table, snapshot, base_url=base_url)
+    if fetched is None:
+        logging.info(f"Macrostrat {table} snapshot is up to date (v{snapshot['v']})")  # type: ignore
+        return False
+
+    changed = snapshot is None or (
+        (fetched["v"], fetched["data"]) != (snapshot["v"], snapshot["data"])
+    )
+    save_snapshot(table, fetched, path)  # Always store the latest validators
+    logging.info(
+        f"Macrostrat {table} snapshot {'updated' if changed else 'unchanged'} (v{fetched['v']}, {len(fetched['data'])} rows)"
+    )
+    return changed
+
+
+@cache
+def get_table(table: str) -> dict:
+    """Get a full `/defs` table from its local snapshot, downloading and storing it on first use.
+
+    In offline mode (MACROSTRAT_OFFLINE), a missing snapshot raises instead of reaching the network.
+    """
+
+    snapshot = load_snapshot(table)
+    if snapshot is not None:
+        return snapshot
+    if is_offline():
+        raise MacrostratSnapshotError(
+            f"No Macrostrat {table} snapshot in {snapshot_dir()} and MACROSTRAT_OFFLINE is set. "
+            "Run scripts/refresh_macrostrat_snapshot.py with network access first."
+        )
+
+    snapshot = fetch_table(table)
+    assert snapshot is not None
+    try:
+        save_snapshot(table, snapshot)
+    except OSError as error:
+        logging.warning(f"Cannot save Macrostrat {table} snapshot: {error}")
+    return snapshot
+
+
 @cache
 def get_all_strat_names(long: bool = False) -> list[str]:
-    """Get all stratigraphic names from macrostrat API."""
+    """Get all stratigraphic names from macrostrat."""
 
-    url = f"{BASE_URL}/defs/strat_names?all"
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json()["success"]["data"]
+    data = get_table("strat_names")["data"]
 
     key = "strat_name_long" if long else "strat_name"
     return sorted(list(set([x[key] for x in data])))
@@ -60,12 +217,9 @@ def get_all_strat_names(long: bool = False) -> list[str]:
 
 @cache
 def get_all_mineral_names(lower: bool = True) -> list[str]:
-    """Get all mineral names from macrostrat API."""
+    """Get all mineral names from macrostrat."""
 
-    url = f"{BASE_URL}/defs/minerals?all"
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json()["success"]["data"]
+    data = get_table("minerals")["data"]
     names = sorted(list(set([x["mineral"] for x in data])))
 
     if not lower:
@@ -75,80 +229,358 @@ def get_all_mineral_names(lower: bool = True) -> list[str]:
 
 @cache
 def get_all_intervals() -> list[dict]:
-    """Get all stratigraphic intervals from macrostrat API."""
+    """Get all stratigraphic intervals from macrostrat."""
 
-    url = f"{BASE_URL}/defs/intervals?all"
-    r = requests.get(url)
-    r.raise_for_status()
-    data = r.json()["success"]["data"]
-    return data
+    return get_table("intervals")["data"]
 
 
-async def get_records(
+def mirror_path() -> Path:
+    return Path(os.getenv("MACROSTRAT_MIRROR_SQLITE", snapshot_dir() / MIRROR_FILE))
+
+
+class MacrostratMirror:
+    """Read-only SQLite mirror of the Macrostrat strat_names, minerals and lithologies tables.
+
+    Raw records are stored as JSON and indexed by id and by name (as is and case-insensitive), so that a lookup
+    is a local index search instead of an HTTP request. Built from the snapshots by `build_mirror`.
+
+    Usage:
+    mirror = MacrostratMirror("text2graph/binaries/macrostrat/macrostrat.sqlite")
+    mirror.get_records(EntityType.MINERAL, "quartz", exact=True)
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.mtime = self.path.stat().st_mtime
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self.versions = dict(self.conn.execute("SELECT table_name, v FROM meta;"))
+
+    def _select(self, table: str, where: str, params: tuple) -> list[dict]:
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT record FROM {table} WHERE {where} ORDER BY id;", params
+            ).fetchall()
+        records = [json.loads(row[0]) for row in rows]
+        for record in records:
+            record["macrostrat_version"] = self.versions[table]
+        return records
+
+    def get_records(
+        self, entity_type: EntityType, name: str, exact: bool = False
+    ) -> list[dict]:
+        """Records named `name`.
+
+        Without `exact`, names are matched case-insensitively, falling back to names starting with `name`.
+        """
+
+        table = MIRROR_TABLES[entity_type][0]
+        if exact:
+            return self._select(table, "name = ?", (name,))
+
+        records = self._select(table, "name = ? COLLATE NOCASE", (name,))
+        if not records:
+            pattern = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            records = self._select(table, "name LIKE ? ESCAPE '\\'", (pattern + "%",))
+        return records
+
+    def get_record(self, entity_type: EntityType, id: int) -> dict | None:
+        """Record by its Macrostrat id (`strat_name_id`, `mineral_id` or `lith_id`)."""
+
+        records = self._select(MIRROR_TABLES[entity_type][0], "id = ?", (id,))
+        return records[0] if records else None
+
+
+def build_mirror(path: Path | None = None, snapshot_path: Path | None = None) -> Path:
+    """Build the SQLite mirror from the snapshots and atomically replace the previous one."""
+
+    snapshot_path = snapshot_path or snapshot_dir()
+    path = path or mirror_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Each builder writes its own temporary database, which replaces the mirror once complete
+    with atomic_path(path) as tmp_path:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            write_mirror_tables(conn, snapshot_path)
+            conn.commit()
+        finally:
+            conn.close()
+    return path
+
+
+def write_mirror_tables(conn: sqlite3.Connection, snapshot_path: Path) -> None:
+    """Create and fill the mirrored tables from the snapshots in `snapshot_path`."""
+
+    conn.execute(
+        "CREATE TABLE meta (table_name TEXT PRIMARY KEY, v INTEGER, fetched_at TEXT);"
+    )
+    for table, name_key, id_key in MIRROR_TABLES.values():
+        snapshot = load_snapshot(table, snapshot_path)
+        if snapshot is None:
+            raise MacrostratSnapshotError(
+                f"No Macrostrat {table} snapshot in {snapshot_path}"
+            )
+
+        conn.execute(
+            f"CREATE TABLE {table} (id INTEGER, name TEXT, record TEXT NOT NULL);"
+        )
+        conn.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?);",
+            [
+                (record.get(id_key), record.get(name_key), json.dumps(record))
+                for record in snapshot["data"]
+            ],
+        )
+        conn.execute(f"CREATE INDEX idx_{table}_id ON {table} (id);")
+        conn.execute(f"CREATE INDEX idx_{table}_name ON {table} (name);")
+        conn.execute(
+            f"CREATE INDEX idx_{table}_name_nocase ON {table} (name COLLATE NOCASE);"
+        )
+        conn.execute(
+            "INSERT INTO meta VALUES (?, ?, ?);",
+            (table, snapshot["v"], snapshot.get("fetched_at")),
+        )
+
+
+_mirror: MacrostratMirror | None = None
+
+
+def get_mirror() -> MacrostratMirror | None:
+    """Get the local mirror, reopened whenever a sync job replaced it, or None if there is none."""
+
+    global _mirror
+    path = mirror_path()
+    if not path.is_file():
+        return None
+    if _mirror is None or _mirror.path != path or _mirror.mtime != path.stat().st_mtime:
+        _mirror = MacrostratMirror(path)
+    return _mirror
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+
+
+class MacrostratClient:
+    """Long-lived pooled client for Macrostrat API calls.
+
+    Connections are kept alive (over HTTP/2 when `h2` is installed), at most `max_concurrency` requests are in
+    flight to Macrostrat, and connection errors, timeouts and 429/5xx responses are retried with jittered
+    exponential backoff.
+
+    Usage:
+    client = get_macrostrat_client()
+    data = await client.get_json("/defs/minerals", params={"mineral": "quartz"})
+    await close_macrostrat_client()
+    """
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+    ) -> None:
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+
+    async def get_json(self, path: str, params: dict | None = None) -> dict:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.retries + 1),
+            wait=wait_random_exponential(multiplier=0.5, max=10),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        ):
+            with attempt:
+                async with self.semaphore:
+                    response = await self.client.get(path, params=params)
+                response.raise_for_status()
+                return response.json()
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_clients: LoopBound[MacrostratClient] = LoopBound(
+    MacrostratClient, lambda client: client.aclose()
+)
+
+
+def get_macrostrat_client() -> MacrostratClient:
+    """Get the process-wide Macrostrat client of the running event loop."""
+    return _clients.get()
+
+
+async def close_macrostrat_client() -> None:
+    """Close the pooled connections of the process-wide Macrostrat client."""
+    await _clients.aclose()
+
+
+async def _fetch_records(
     entity_type: EntityType, name: str, exact: bool = False
 ) -> list[dict]:
-    """Get the records for a given record."""
+    """Get the records for a given name from the Macrostrat API."""
+
+    if is_offline():
+        raise MacrostratSnapshotError(
+            f"Cannot fetch Macrostrat {entity_type.value} '{name}': MACROSTRAT_OFFLINE is set and there is no mirror"
+        )
 
     routes = {
-        "strat_name": f"{BASE_URL}/defs/strat_names?strat_name={name}",
-        "mineral": f"{BASE_URL}/defs/minerals?mineral={name}",
+        "strat_name": ("/defs/strat_names", "strat_name"),
+        "mineral": ("/defs/minerals", "mineral"),
+        "lithology": ("/defs/lithologies", "lith"),
     }
+    match_keys = {"strat_name": "strat_name", "mineral": "mineral", "lithology": "name"}
 
-    match_keys = {"strat_name": "strat_name", "mineral": "mineral"}
+    path, param = routes[entity_type.value]
+    success = (await get_macrostrat_client().get_json(path, params={param: name}))[
+        "success"
+    ]
+    matches = success["data"]
+    for match in matches:
+        match["macrostrat_version"] = success["v"]
+
+    if exact:
+        matches = [
+            match for match in matches if match[match_keys[entity_type.value]] == name
+        ]
+    return matches
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(routes[entity_type.value])
-        response.raise_for_status()
-        macrostrat_version = response.json()["success"]["v"]
-        matches = response.json()["success"]["data"]
-        for match in matches:
-            match["macrostrat_version"] = macrostrat_version
 
-        if exact:
-            matches = [
-                match
-                for match in matches
-                if match[match_keys[entity_type.value]] == name
-            ]
-        if not matches:
-            logging.warning(f"No record found for '{name}' in Macrostrat.")
+async def get_records(
+    entity_type: EntityType, name: str, exact: bool = False
+) -> list[dict]:
+    """Get the records for a given name, from the local mirror if there is one."""
+
+    mirror = get_mirror()
+    if mirror is not None:
+        matches = mirror.get_records(entity_type, name, exact=exact)
+    else:
+        matches = await _fetch_records(entity_type, name, exact=exact)
+
+    if not matches:
+        logging.warning(f"No record found for '{name}' in Macrostrat.")
     return matches
 
 
-def _find_word_occurrences(text: str, word: str) -> list[dict]:
-    """Find all occurrences of a word in a given text and get its position of occurrence."""
+# Runs of word characters or single other characters, so that token edges are where `\b` can match
+TOKEN_PATTERN = re.compile(r"\w+|\W")
+WORD_IDS = ""  # Trie key of the ids of words ending at a node, never a token
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _is_word_boundary(text: str, i: int) -> bool:
+    """Whether `\b` matches at position i of text."""
+    before = i > 0 and _is_word_char(text[i - 1])
+    after = i < len(text) and _is_word_char(text[i])
+    return before != after
 
-    matches = [match for match in re.finditer(rf"\b{re.escape(word)}\b", text)]
-    results = [
-        {
-            "word": match.group(),
-            "start": match.start(),
-            "end": match.end(),
-            "link": quote(
-                f"{BASE_URL}/defs/autocomplete?query={match.group()}", safe=":/?="
-            ),
-        }
-        for match in matches
-    ]
-    return results
+
+def _occurrence(word: str, start: int, end: int) -> dict[str, str | int]:
+    return {
+        "word": word,
+        "start": start,
+        "end": end,
+        "link": quote(f"{BASE_URL}/defs/autocomplete?query={word}", safe=":/?="),
+    }
+
+
+class OccurrenceMatcher:
+    """Prebuilt word-boundary-aware trie of known terms, finding them in texts as `\b{term}\b` would.
+
+    Terms are split into tokens and matching walks the trie from each token of the text, so its cost depends on
+    the length of the text (and of the longest term), not on the number of terms.
+
+    Usage:
+    matcher = OccurrenceMatcher(get_all_strat_names())
+    matcher.find_all("The Shakopee Fm overlies the Oneota Dolomite.")
+    """
+
+    def __init__(self, words: list[str], ignore_case: bool = False) -> None:
+        self.ignore_case = ignore_case
+        self.root: dict = {}
+        self.depth = 0  # Most tokens in a term
+        for i, word in enumerate(words):
+            if ignore_case:
+                word = word.lower()
+            tokens = TOKEN_PATTERN.findall(word)
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(WORD_IDS, []).append(i)
+            self.depth = max(self.depth, len(tokens))
+
+    def find_all(self, text: str) -> list[dict[str, str | int]]:
+        """Find all occurrences of the terms in a given text and get their position of occurrence."""
+
+        if self.ignore_case:
+            text = text.lower()
+        tokens = [
+            (match.group(), match.start()) for match in TOKEN_PATTERN.finditer(text)
+        ]
+
+        matches = []
+        last_end: dict[int, int] = {}  # Occurrences of the same term do not overlap
+        for i, (_, start) in enumerate(tokens):
+            node = self.root
+            for token, token_start in tokens[i : i + self.depth]:
+                node = node.get(token)
+                if node is None:
+                    break
+                end = token_start + len(token)
+                if WORD_IDS not in node:
+                    continue
+                if not (
+                    _is_word_boundary(text, start) and _is_word_boundary(text, end)
+                ):
+                    continue
+                for word_id in node[WORD_IDS]:
+                    if last_end.get(word_id, 0) <= start:
+                        last_end[word_id] = end
+                        matches.append((start, word_id, end))
+
+        # Same order as matching the terms one by one and sorting by start
+        return [
+            _occurrence(text[start:end], start, end)
+            for start, _, end in sorted(matches)
+        ]
+
+
+@lru_cache(maxsize=8)
+def get_occurrence_matcher(
+    words: tuple[str, ...], ignore_case: bool = False
+) -> OccurrenceMatcher:
+    return OccurrenceMatcher(list(words), ignore_case=ignore_case)
 
 
 @log_time
 def find_all_occurrences(
     text: str, words: list[str], ignore_case: bool = False
 ) -> list[dict[str, str | int]]:
-    """Find all occurrences of a list of terms in a given text and get its position of occurrence."""
-
-    if ignore_case:
-        words = [word.lower() for word in words]
-        text = text.lower()
+    """Find all occurrences of a list of terms in a given text and get its position of occurrence.
 
-    occurrences = []
-    for word in words:
-        if word not in text:
-            continue
-        this_occ = _find_word_occurrences(text=text, word=word)
-        if this_occ:
-            occurrences.extend(this_occ)
+    The matcher of a list of terms is built once; callers with a fixed lexicon can also keep an
+    `OccurrenceMatcher` of their own.
+    """
 
-    return sorted(occurrences, key=lambda x: x["start"])
+    return get_occurrence_matcher(tuple(words), ignore_case).find_all(text)
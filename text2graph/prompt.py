@@ -1,20 +1,36 @@
 from abc import ABC, abstractmethod
+from enum import Enum
 
 from text2graph.macrostrat import (
     EntityType,
-    find_all_occurrences,
+    OccurrenceMatcher,
     get_all_mineral_names,
     get_all_strat_names,
 )
 from text2graph.usgs import CRITICAL_MINERALS
 
+PACKING_INSTRUCTION = 'The TEXT contains several paragraphs, each starting with its [paragraph_id]. Add a "paragraph_id" key to every triplet with the id of the paragraph it comes from.'
+
+
+class PromptLayout(Enum):
+    """Arrangement of the prompt across GPT style messages.
+
+    DEFAULT: dynamic known entities are embedded in the system prompt.
+    PREFIX_CACHE: the system prompt is static (byte-identical across requests) and the dynamic known entities
+        and text come last, so that vLLM/Ollama KV prefix caching and provider prompt caching can hit.
+    """
+
+    DEFAULT = "default"
+    PREFIX_CACHE = "prefix_cache"
+
 
 class PromptHandler(ABC):
     """Abstract class for prompt handler.
 
     Usage:
     1. Implement `get_system_prompt` and `get_user_prompt` methods.
-    2. Use create_gpt_messages to create GPT style messages format.
+    2. Optionally implement `get_static_system_prompt` and `get_dynamic_prompt` to support `PromptLayout.PREFIX_CACHE`.
+    3. Use create_gpt_messages to create GPT style messages format.
     """
 
     @abstractmethod
@@ -38,12 +54,48 @@ class PromptHandler(ABC):
     @property
     def predicate_key(self) -> str: ...
 
-    def get_gpt_messages(self, text) -> list[dict]:
+    def get_static_system_prompt(self) -> str | None:
+        """System prompt without any text-dependent content."""
+        return self.get_system_prompt("")
+
+    def get_dynamic_prompt(self, text: str) -> str:
+        """Text-dependent instructions (e.g., known entities) moved out of the system prompt."""
+        return ""
+
+    def get_gpt_messages(
+        self, text, layout: PromptLayout = PromptLayout.DEFAULT
+    ) -> list[dict]:
         """Create GPT style messages format."""
         messages = []
-        if system_prompt := self.get_system_prompt(text):
+        if layout == PromptLayout.PREFIX_CACHE:
+            system_prompt = self.get_static_system_prompt()
+            user_prompt = " ".join(
+                prompt
+                for prompt in [
+                    self.get_dynamic_prompt(text),
+                    self.get_user_prompt(text),
+                ]
+                if prompt
+            )
+        else:
+            system_prompt = self.get_system_prompt(text)
+            user_prompt = self.get_user_prompt(text)
+
+        if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": self.get_user_prompt(text)})
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    def get_packed_gpt_messages(
+        self, texts: dict[str, str], layout: PromptLayout = PromptLayout.DEFAULT
+    ) -> list[dict]:
+        """Create GPT style messages for several paragraphs at once, keyed by paragraph id."""
+        packed_text = "\n\n".join(f"[{id}] {text}" for id, text in texts.items())
+        messages = self.get_gpt_messages(packed_text, layout=layout)
+        if messages[0]["role"] == "system":
+            messages[0]["content"] = f"{messages[0]['content']} {PACKING_INSTRUCTION}"
+        else:
+            messages.insert(0, {"role": "system", "content": PACKING_INSTRUCTION})
         return messages
 
     @property
@@ -60,15 +112,22 @@ class StratPromptHandlerV3(PromptHandler):
 
     def __init__(self):
         self.strat_names = get_all_strat_names()
+        self.matcher = OccurrenceMatcher(self.strat_names)
 
     def get_known_entities(self, text: str) -> str:
-        known_strats = find_all_occurrences(text, self.strat_names)
+        known_strats = self.matcher.find_all(text)
         known_strat_names = set([entity["word"] for entity in known_strats])
         return ", ".join(known_strat_names)
 
     def get_system_prompt(self, text: str) -> str:
         return f'You are a geology expert and you are expert in understanding mining reports and technical documents. You will extract relationship triplets from the given context. The triplets is in the following format: ("location", "relationship", and "stratigraphic name"). Prioritize these known stratigraphic names: {self.get_known_entities(text)}, but also include anything that looks like stratigraphic names. Return in json format like this: {{"triplets: [{{"location": "location_1", "relationship": "relationship_1", "stratigraphic_name": "stratigraphic_name_1"}}...]}}. Return an empty dictionary if there is no location. Do not provide explanations or context.'
 
+    def get_static_system_prompt(self) -> str:
+        return 'You are a geology expert and you are expert in understanding mining reports and technical documents. You will extract relationship triplets from the given context. The triplets is in the following format: ("location", "relationship", and "stratigraphic name"). Prioritize the KNOWN stratigraphic names given with the TEXT, but also include anything that looks like stratigraphic names. Return in json format like this: {"triplets: [{"location": "location_1", "relationship": "relationship_1", "stratigraphic_name": "stratigraphic_name_1"}...]}. Return an empty dictionary if there is no location. Do not provide explanations or context.'
+
+    def get_dynamic_prompt(self, text: str) -> str:
+        return f"KNOWN stratigraphic names: {self.get_known_entities(text)}."
+
     def get_user_prompt(self, text: str) -> str:
         return f"Extract relationship triplets from this TEXT: {text}, Use JSON format."
 
@@ -103,17 +162,22 @@ class MineralPromptHandlerV0(PromptHandler):
         self.mineral_names = sorted(
             list(set(self.macrostrat_minerals + self.usgs_critical_minerals))
         )
+        self.matcher = OccurrenceMatcher(self.mineral_names, ignore_case=True)
 
     def get_known_entities(self, text: str) -> str:
-        known_minerals = find_all_occurrences(
-            text, self.mineral_names, ignore_case=True
-        )
+        known_minerals = self.matcher.find_all(text)
         known_mineral_names = set([entity["word"] for entity in known_minerals])
         return ", ".join(known_mineral_names)
 
     def get_system_prompt(self, text: str) -> str:
         return f'You are a geology expert and you are expert in understanding mining reports and technical documents. You will extract relationship triplets from the given context. The triplets is in the following format: ("location", "relationship", and "mineral_name"). Prioritize these known mineral names names: {self.get_known_entities(text)}, do not include anything that is not on this list. Return in json format like this: {{"triplets: [{{"location": "location_1", "relationship": "relationship_1", "mineral_name": "mineral_name_1"}}...]}}. Return an empty dictionary if there is no location. Do not provide explanations or context.'
 
+    def get_static_system_prompt(self) -> str:
+        return 'You are a geology expert and you are expert in understanding mining reports and technical documents. You will extract relationship triplets from the given context. The triplets is in the following format: ("location", "relationship", and "mineral_name"). Prioritize the KNOWN mineral names given with the TEXT, do not include anything that is not on this list. Return in json format like this: {"triplets: [{"location": "location_1", "relationship": "relationship_1", "mineral_name": "mineral_name_1"}...]}. Return an empty dictionary if there is no location. Do not provide explanations or context.'
+
+    def get_dynamic_prompt(self, text: str) -> str:
+        return f"KNOWN mineral names: {self.get_known_entities(text)}."
+
     def get_user_prompt(self, text: str) -> str:
         return f"Extract relationship triplets from this TEXT: {text}, Use JSON format."
 
@@ -0,0 +1,627 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from functools import cached_property
+from typing import AsyncIterator, Awaitable, Callable
+from urllib.parse import urljoin
+
+import httpx
+from anthropic import AsyncAnthropic
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from text2graph.utils import JSONStreamValidator, LoopBound
+
+load_dotenv()
+
+DEFAULT_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+
+class ConnectionStats:
+    """Count requests and newly opened TCP connections of an httpx client.
+
+    Counts are also added to `parent`, e.g., the totals of a router over its endpoints.
+    """
+
+    def __init__(self, parent: "ConnectionStats | None" = None) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.parent = parent
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self._count_request()
+        request.extensions["trace"] = self._trace
+
+    def _count_request(self) -> None:
+        self.requests += 1
+        if self.parent is not None:
+            self.parent._count_request()
+
+    def _count_connection(self) -> None:
+        self.connections += 1
+        if self.parent is not None:
+            self.parent._count_connection()
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self._count_connection()
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    def to_dict(self) -> dict[str, int | float]:
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused": self.reused,
+            "reuse_ratio": self.reused / self.requests if self.requests else 0.0,
+        }
+
+
+class Provider(ABC):
+    """Abstract class for an async LLM provider.
+
+    Usage:
+    1. Implement `complete`, which returns the raw completion text.
+    2. Keep one instance alive per event loop so that its HTTP connections are reused.
+    3. Set `max_concurrency` to the number of in-flight requests the backend handles well, callers fanning out
+       requests hold `semaphore` so that the limit is shared by all of them.
+    """
+
+    max_concurrency: int = 4
+
+    def __init__(self) -> None:
+        self.stats = ConnectionStats()
+
+    @cached_property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Limit of `max_concurrency` in-flight requests, shared by all callers of this provider."""
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def new_http_client(self, **kwargs) -> httpx.AsyncClient:
+        """Pooled keep-alive client reporting to `self.stats`."""
+        return httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=DEFAULT_LIMITS,
+            event_hooks={"request": [self.stats.on_request]},
+            **kwargs,
+        )
+
+    @abstractmethod
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str: ...
+
+    async def stream(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> AsyncIterator[str]:
+        """Yield completion text chunks, closing the underlying response when the generator is closed.
+
+        Providers without streaming support yield the whole completion at once.
+        """
+        yield await self.complete(model, messages, temperature)
+
+    async def complete_json(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        """Stream the completion and stop generating as soon as the top-level json value closes."""
+
+        validator = JSONStreamValidator()
+        chunks = []
+        stream = self.stream(model, messages, temperature)
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if validator.feed(chunk):
+                    break
+        finally:
+            await stream.aclose()  # type: ignore
+
+        # Hand back the raw text if it never formed a json value, post-processing reports the error
+        return validator.text if validator.closed else "".join(chunks)
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+        ...
+
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
+
+class OpenAIProvider(Provider):
+    """OpenAI chat completion in json mode."""
+
+    max_concurrency = 8
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.client = AsyncOpenAI(http_client=self.new_http_client())
+
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        completion = await self.client.chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=messages,  # type: ignore
+            temperature=temperature,
+            stream=False,
+        )
+        return completion.choices[0].message.content  # type: ignore
+
+    async def stream(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=messages,  # type: ignore
+            temperature=temperature,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.response.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+
+class AnthropicProvider(Provider):
+    """Anthropic messages API."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.client = AsyncAnthropic(http_client=self.new_http_client())
+
+    @staticmethod
+    def to_anthropic_kwargs(messages: list[dict]) -> dict:
+        """Split GPT style messages into Anthropic `system` and `messages` arguments."""
+
+        system_message = None
+        user_messages = []
+        for message in messages:
+            if message["role"] == "system":
+                system_message = message["content"]
+            elif message["role"] == "user":
+                user_messages.append(
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": message["content"]}],
+                    }
+                )
+
+        kwargs: dict = {"messages": user_messages}
+        if system_message:
+            kwargs["system"] = system_message
+        return kwargs
+
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        response = await self.client.messages.create(
+            model=model,
+            max_tokens=4096,
+            temperature=temperature,
+            stream=False,
+            **self.to_anthropic_kwargs(messages),
+        )
+        return response.content[0].text
+
+    async def stream(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> AsyncIterator[str]:
+        stream = await self.client.messages.create(
+            model=model,
+            max_tokens=4096,
+            temperature=temperature,
+            stream=True,
+            **self.to_anthropic_kwargs(messages),
+        )
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta":
+                    yield event.delta.text  # type: ignore
+        finally:
+            await stream.response.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+
+class OllamaProvider(Provider):
+    """Self-hosted Ollama chat endpoint (`OLLAMA_URL`)."""
+
+    max_concurrency = 2
+
+    def __init__(
+        self,
+        url: str | None = None,
+        user: str | None = None,
+        password: str | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        super().__init__()
+        url = url or os.getenv("OLLAMA_URL")
+        if not url:
+            raise ValueError("OLLAMA_URL is not set.")
+        self.url = url
+
+        user = os.getenv("OLLAMA_USER", "") if user is None else user
+        password = os.getenv("OLLAMA_PASSWORD", "") if password is None else password
+        self.client = self.new_http_client(
+            auth=httpx.BasicAuth(user, password) if user or password else None,
+            headers=headers,
+        )
+
+    @staticmethod
+    def to_payload(
+        model: str, messages: list[dict], temperature: float, stream: bool = False
+    ) -> dict:
+        """Vanilla Ollama API style payload."""
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+            "format": "json",
+        }
+
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        response = await self.client.post(
+            self.url, json=self.to_payload(model, messages, temperature)
+        )
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    async def stream(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> AsyncIterator[str]:
+        # Leaving the context closes the connection, which stops Ollama from generating
+        async with self.client.stream(
+            "POST",
+            self.url,
+            json=self.to_payload(model, messages, temperature, stream=True),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                yield data["message"]["content"]
+                if data.get("done"):
+                    break
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class LLMQueueProvider(OllamaProvider):
+    """CHTC Ollama proxy (`CHTC_LLM_HOST`, `CHTC_LLM_PORT`, `CHTC_LLM_API_KEY`)."""
+
+    max_concurrency = 4
+
+    def __init__(self) -> None:
+        host, port = os.getenv("CHTC_LLM_HOST"), os.getenv("CHTC_LLM_PORT")
+        if not host or not port:
+            raise ValueError("CHTC_LLM_HOST and CHTC_LLM_PORT must be set.")
+        super().__init__(
+            url=f"http://{host}:{port}/api/chat",
+            user="",
+            password="",
+            headers={"Api-Key": os.getenv("CHTC_LLM_API_KEY", "")},
+        )
+
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        response = await self.client.post(
+            self.url, json=self.to_payload(model, messages, temperature)
+        )
+        response.raise_for_status()
+        return (
+            json.loads(response.json()["_content"])["message"]["content"]
+            .strip()
+            .replace("\\", "")
+        )
+
+    async def stream(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> AsyncIterator[str]:
+        # The CHTC proxy only returns complete responses
+        yield await self.complete(model, messages, temperature)
+
+
+class RoutedEndpoint:
+    """One Ollama-compatible endpoint with its load and health state."""
+
+    def __init__(self, provider: OllamaProvider, alpha: float = 0.3) -> None:
+        self.provider = provider
+        self.alpha = alpha
+        self.in_flight = 0
+        self.ewma_latency: float | None = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.n_requests = 0
+
+    @property
+    def url(self) -> str:
+        return self.provider.url
+
+    @property
+    def health_url(self) -> str:
+        return urljoin(self.url, "/api/tags")
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def load(self, default_latency: float) -> float:
+        """Expected wait for a new request: queued requests times typical latency."""
+        latency = (
+            self.ewma_latency if self.ewma_latency is not None else default_latency
+        )
+        return (self.in_flight + 1) * latency
+
+    def record_success(self, latency: float) -> None:
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = (
+                self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+            )
+
+    def record_failure(self, max_failures: int, cooldown: float) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures:
+            self.ejected_until = time.monotonic() + cooldown
+            logging.warning(f"Ejected LLM endpoint {self.url} for {cooldown}s")
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency": self.ewma_latency,
+            "requests": self.n_requests,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": not self.is_available(time.monotonic()),
+        }
+
+
+def is_endpoint_failure(error: httpx.HTTPError) -> bool:
+    """Whether an error says the endpoint is unhealthy: transport errors, timeouts and 5xx responses."""
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+
+
+class OllamaRouter(Provider):
+    """Spread open-source model requests across several Ollama-compatible endpoints.
+
+    Each request goes to the available endpoint with the lowest `(in_flight + 1) * ewma_latency`.
+    Endpoints failing `max_failures` times in a row are ejected for `cooldown` seconds, and
+    re-admitted early when a health check (`GET /api/tags`) succeeds.
+
+    Usage:
+    router = OllamaRouter(["http://gpu1:11434/api/chat", "http://gpu2:11434/api/chat"])
+    raw_output = await router.complete("mixtral", messages)
+    """
+
+    def __init__(
+        self,
+        urls: list[str] | None = None,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+        health_check_interval: float | None = 15.0,
+    ) -> None:
+        if urls is None:
+            urls = [url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",")]
+        urls = [url for url in urls if url]
+        if not urls:
+            raise ValueError("OLLAMA_URLS is not set.")
+
+        super().__init__()
+        self.endpoints = [RoutedEndpoint(OllamaProvider(url=url)) for url in urls]
+        for endpoint in self.endpoints:
+            endpoint.provider.stats.parent = self.stats  # Sum over all endpoints
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.health_check_interval = health_check_interval
+        self.max_concurrency = 2 * len(self.endpoints)
+        self._health_check_task: asyncio.Task | None = None
+
+    def select(self, exclude: set[int] | None = None) -> int:
+        """Index of the endpoint that should serve the next request."""
+
+        now = time.monotonic()
+        candidates = [
+            i
+            for i, endpoint in enumerate(self.endpoints)
+            if not exclude or i not in exclude
+        ]
+        available = [i for i in candidates if self.endpoints[i].is_available(now)]
+
+        # Fail open: try the endpoint that is closest to being re-admitted
+        if not available:
+            return min(candidates, key=lambda i: self.endpoints[i].ejected_until)
+
+        known = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        return min(
+            available,
+            key=lambda i: (self.endpoints[i].load(default_latency), random.random()),
+        )
+
+    async def _route(self, call: Callable[[OllamaProvider], Awaitable[str]]) -> str:
+        """Run `call` on the selected endpoint, failing over to the others on HTTP errors."""
+        self._ensure_health_checks()
+
+        tried: set[int] = set()
+        while True:
+            i = self.select(exclude=tried)
+            endpoint = self.endpoints[i]
+            endpoint.in_flight += 1
+            endpoint.n_requests += 1
+            t0 = time.perf_counter()
+            try:
+                output = await call(endpoint.provider)
+            except httpx.HTTPError as e:
+                # A 4xx (e.g., an unknown model) would fail the same way on every endpoint
+                if not is_endpoint_failure(e):
+                    raise
+                endpoint.record_failure(self.max_failures, self.cooldown)
+                tried.add(i)
+                logging.warning(f"LLM endpoint {endpoint.url} failed: {e}")
+                if len(tried) == len(self.endpoints):
+                    raise
+                continue
+            finally:
+                endpoint.in_flight -= 1
+
+            endpoint.record_success(time.perf_counter() - t0)
+            return output
+
+    async def complete(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        return await self._route(
+            lambda provider: provider.complete(model, messages, temperature)
+        )
+
+    async def complete_json(
+        self, model: str, messages: list[dict], temperature: float = 0.0
+    ) -> str:
+        return await self._route(
+            lambda provider: provider.complete_json(model, messages, temperature)
+        )
+
+    async def health_check(self) -> None:
+        """Probe every endpoint, ejecting unreachable ones and re-admitting recovered ones."""
+
+        async def probe(endpoint: RoutedEndpoint) -> None:
+            try:
+                response = await endpoint.provider.client.get(
+                    endpoint.health_url, timeout=5.0
+                )
+                response.raise_for_status()
+            except httpx.HTTPError:
+                endpoint.record_failure(max_failures=1, cooldown=self.cooldown)
+                return
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+
+        await asyncio.gather(*[probe(endpoint) for endpoint in self.endpoints])
+
+    def _ensure_health_checks(self) -> None:
+        if not self.health_check_interval or self._health_check_task is not None:
+            return
+
+        async def loop() -> None:
+            while True:
+                await asyncio.sleep(self.health_check_interval)  # type: ignore
+                await self.health_check()
+
+        self._health_check_task = asyncio.create_task(loop())
+
+    async def aclose(self) -> None:
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        await asyncio.gather(*[e.provider.aclose() for e in self.endpoints])
+
+    @property
+    def endpoint_stats(self) -> list[dict]:
+        return [endpoint.to_dict() for endpoint in self.endpoints]
+
+
+PROVIDERS: dict[str, type[Provider]] = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "ollama": OllamaProvider,
+    "llm_queue": LLMQueueProvider,
+    "ollama_router": OllamaRouter,
+}
+
+
+class ProviderRegistry:
+    """Process-wide registry of long-lived provider clients.
+
+    Usage:
+    registry = get_provider_registry()
+    await registry.startup()  # Optional, eagerly connect all configured providers
+    raw_output = await registry.get("openai").complete("gpt-4o", messages)
+    await registry.aclose()
+    """
+
+    def __init__(self) -> None:
+        # Providers of each running event loop
+        self._providers: LoopBound[dict[str, Provider]] = LoopBound(
+            dict, self._close_providers
+        )
+
+    @staticmethod
+    async def _close_providers(providers: dict[str, Provider]) -> None:
+        await asyncio.gather(*[provider.aclose() for provider in providers.values()])
+
+    def get(self, name: str) -> Provider:
+        """Get or create the provider `name`."""
+
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown provider: {name}")
+
+        providers = self._providers.get()
+        if name not in providers:
+            providers[name] = PROVIDERS[name]()
+        return providers[name]
+
+    async def startup(self, names: list[str] | None = None) -> None:
+        """Create all configured providers up front, skipping unconfigured ones."""
+
+        for name in names or PROVIDERS:
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.info(f"Provider '{name}' is not available: {e}")
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+
+        await self._providers.aclose()
+
+    @property
+    def stats(self) -> dict[str, dict[str, int | float]]:
+        """Connection reuse statistics per provider."""
+        providers = self._providers.current or {}
+        return {name: p.stats.to_dict() for name, p in providers.items()}
+
+
+_registry = ProviderRegistry()
+
+
+def get_provider_registry() -> ProviderRegistry:
+    """Get the process-wide provider registry."""
+    return _registry
+
+
+def get_provider(name: str) -> Provider:
+    """Get the long-lived provider `name` from the process-wide registry.
+
+    Usage:
+    provider = get_provider("openai")
+    raw_output = await provider.complete("gpt-4o", messages)
+    """
+    return _registry.get(name)
@@ -82,6 +82,7 @@ class Lithology(BaseModel):
             logging.warning(f"No records found for lithology '{self.name}'")
             return
 
+        macrostrat_version = hit.pop("macrostrat_version", None)
         # Load data into model
         for k, v in hit.items():
             if k == "class":
@@ -93,6 +94,7 @@ class Lithology(BaseModel):
 
         self.provenance = Provenance(
             source_name="Macrostrat",
+            source_version=macrostrat_version,
             source_url=f"{macrostrat.BASE_URL}'/defs/lithologies?lith_id={hit['lith_id']}",
             previous=self.provenance,
         )
@@ -1,16 +1,62 @@
+import asyncio
 import datetime
 import functools
 import json
 import logging
+import os
 import sqlite3
 import time
+import uuid
 import warnings
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Callable
+from typing import Any, Awaitable, Callable, Generic, Hashable, Iterator, TypeVar
 
 import numpy as np
 import pandas as pd
 
+T = TypeVar("T")
+
+
+@contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """Yield a unique temporary path next to `path`, which replaces `path` once the block succeeds.
+
+    Concurrent writers each get their own temporary file, and a failed write leaves `path` untouched.
+
+    Usage:
+    with atomic_path(Path("table.sqlite")) as tmp_path:
+        conn = sqlite3.connect(tmp_path)
+        ...
+        conn.close()
+    """
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+    # Created like `open` would, so the file gets the permissions the umask allows
+    os.close(os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write a text file through a temporary file, so readers see either the old or the new content."""
+
+    with atomic_path(path) as tmp_path:
+        tmp_path.write_text(text)
+
+
+def is_json(text: str) -> bool:
+    """Whether text parses as json, e.g. before caching an LLM output that would otherwise be replayed forever."""
+    try:
+        json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return True
+
 
 def get_output_info(output: str, route: list[str]) -> str:
     """Get the information from the output."""
@@ -83,3 +129,192 @@ def log_time(func: Callable) -> Callable:
         return result
 
     return wrapper
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one shared in-flight call.
+
+    Usage:
+    flights = SingleFlight()
+    result = await flights.do(key, lambda: expensive_coroutine(...))
+
+    Callers arriving while a call for `key` is in flight await its result instead of starting a new call.
+    The result object is shared, copy it before mutating.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        if key in self._in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shield so that one cancelled caller does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+# The event loop only keeps weak references to tasks
+_shutdown_tasks: set[asyncio.Task] = set()
+
+
+def close_on_loop_shutdown(aclose: Callable[[], Awaitable[None]]) -> None:
+    """Await `aclose` when the running event loop shuts down.
+
+    `asyncio.run` cancels the pending tasks of its loop before closing it, which is the last moment connections
+    bound to that loop can still be closed. Loops closed by hand need an explicit close instead.
+    """
+
+    async def wait_and_close() -> None:
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await aclose()
+
+    task = asyncio.get_running_loop().create_task(wait_and_close())
+    _shutdown_tasks.add(task)
+    task.add_done_callback(_shutdown_tasks.discard)
+
+
+class LoopBound(Generic[T]):
+    """One shared instance of a resource per running event loop, such as a pooled httpx client.
+
+    httpx connection pools are bound to the event loop that opened them, so a new instance is created for each
+    new loop. Each instance is closed when its loop shuts down, or by `aclose`.
+
+    Usage:
+    clients = LoopBound(httpx.AsyncClient, lambda client: client.aclose())
+    client = clients.get()
+    await clients.aclose()
+    """
+
+    def __init__(
+        self, factory: Callable[[], T], close: Callable[[T], Awaitable[Any]]
+    ) -> None:
+        self.factory = factory
+        self.close = close
+        self._instance: T | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._open: list[T] = []
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        if self._instance is None or loop is not self._loop:
+            self._release()
+            instance = self.factory()
+            self._instance, self._loop = instance, loop
+            self._open.append(instance)
+            close_on_loop_shutdown(lambda: self._close(instance))
+        return self._instance
+
+    @property
+    def current(self) -> T | None:
+        """Instance of the last loop, without creating one."""
+        return self._instance
+
+    async def _close(self, instance: T) -> None:
+        if not any(x is instance for x in self._open):
+            return  # Already closed
+        self._open = [x for x in self._open if x is not instance]
+        if instance is self._instance:
+            self._instance, self._loop = None, None
+        await self.close(instance)
+
+    def _release(self) -> None:
+        """Close the instance of a previous loop that is still open."""
+
+        if self._instance is None or self._loop is None:
+            return
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close(self._instance), self._loop)
+        else:
+            logging.warning(
+                f"Dropping {self._instance!r} of a stopped event loop without closing it"
+            )
+            self._open = [x for x in self._open if x is not self._instance]
+        self._instance, self._loop = None, None
+
+    async def aclose(self) -> None:
+        """Close the instance of the running loop."""
+        if self._instance is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._close(self._instance)
+            else:
+                self._release()
+
+
+class JSONStreamValidator:
+    """Incrementally track a streamed JSON value and detect when the top-level object closes.
+
+    Leading text before the first `{` or `[` is skipped, anything after the closing bracket is ignored.
+
+    Usage:
+    validator = JSONStreamValidator()
+    async for chunk in stream:
+        if validator.feed(chunk):
+            break  # Stop generating, the answer is complete
+    data = json.loads(validator.text)
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self.depth = 0
+        self.started = False
+        self.closed = False
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk, return True once the top-level value is closed."""
+        if self.closed:
+            return True
+
+        start = 0
+        for i, char in enumerate(chunk):
+            if not self.started:
+                if char in "{[":
+                    self.started = True
+                    self.depth = 1
+                    start = i
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._chunks.append(chunk[start : i + 1])
+                    self.closed = True
+                    return True
+
+        if self.started:
+            self._chunks.append(chunk[start:])
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)